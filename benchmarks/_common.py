@@ -0,0 +1,21 @@
+#!/usr/bin/python3
+"""Helpers shared by the benchmarks"""
+from models.engine.file_storage import FileStorage
+
+
+def reset():
+    """Forgets every instance FileStorage holds in memory, with the
+    indexes, change tracking and mapped file that go with them, so that
+    each run starts from the same empty state"""
+    mapped = FileStorage._FileStorage__mapped
+    if mapped is not None:
+        mapped.close()
+    FileStorage._FileStorage__mapped = None
+    FileStorage._FileStorage__objects = {}
+    FileStorage._FileStorage__classes = {}
+    FileStorage._FileStorage__shared = set()
+    FileStorage._FileStorage__dirty = set()
+    FileStorage._FileStorage__unloaded = {}
+    FileStorage._FileStorage__dirty_shards = set()
+    FileStorage._FileStorage__children = {}
+    FileStorage._FileStorage__parents = {}
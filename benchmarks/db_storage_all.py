@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+"""Benchmark DBStorage.all() with and without concurrent queries
+
+Usage: python3 -m benchmarks.db_storage_all [latency_ms ...]
+
+Runs on an SQLite database of 2000 rows per class. Each latency is
+added to every statement, standing for the round trip to a MySQL
+server, then all() is timed with the classes queried one after another
+and with HBNB_DB_ALL_WORKERS=6, printing the per class timings of the
+concurrent run.
+"""
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+from sqlalchemy import event
+from models.engine.sqlite_storage import SQLiteStorage
+from models.amenity import Amenity
+from models.city import City
+from models.place import Place
+from models.review import Review
+from models.state import State
+from models.user import User
+
+
+def fill(storage, rows):
+    """Stores rows objects of every class, parents saved first"""
+    users = [User(email="user_{}@hbnb.io".format(i), password="pwd")
+             for i in range(rows)]
+    states = [State(name="State_{}".format(i)) for i in range(rows)]
+    cities = [City(name="City_{}".format(i), state_id=state.id)
+              for i, state in enumerate(states)]
+    places = [Place(name="Place_{}".format(i), city_id=city.id,
+                    user_id=user.id)
+              for i, (city, user) in enumerate(zip(cities, users))]
+    reviews = [Review(text="Great stay", place_id=place.id,
+                      user_id=place.user_id) for place in places]
+    amenities = [Amenity(name="Amenity_{}".format(i)) for i in range(rows)]
+    for tier in (users + states + amenities, cities, places, reviews):
+        for obj in tier:
+            storage.new(obj)
+        storage.save()
+
+
+def run(workers, latency):
+    """Seconds all() takes on a fresh storage, and its timings"""
+    with mock.patch.dict(os.environ, {"HBNB_SQLITE_PATH": "hbnb.db",
+                                      "HBNB_DB_ALL_WORKERS": workers}):
+        storage = SQLiteStorage()
+    engine = storage._DBStorage__engine
+    event.listen(engine, "before_cursor_execute",
+                 lambda *args: time.sleep(latency))
+    storage.reload()
+    start = time.perf_counter()
+    storage.all()
+    elapsed = time.perf_counter() - start
+    storage.close()
+    return elapsed, storage.timings()
+
+
+def main(latencies):
+    """Print one row per latency, then the per class timings"""
+    with mock.patch.dict(os.environ, {"HBNB_SQLITE_PATH": "hbnb.db"}):
+        storage = SQLiteStorage()
+    storage.reload()
+    fill(storage, 2000)
+    storage.close()
+    print("{:>11} {:>14} {:>14}  {}".format(
+        "latency ms", "sequential ms", "concurrent ms", "slowest class ms"))
+    for latency in latencies:
+        sequential, _ = run("0", latency / 1e3)
+        concurrent, timings = run("6", latency / 1e3)
+        slowest = max(seconds for name, seconds in timings.items()
+                      if name != "total")
+        print("{:>11} {:>14.1f} {:>14.1f}  {:.1f}".format(
+            latency, sequential * 1e3, concurrent * 1e3, slowest * 1e3))
+
+
+if __name__ == "__main__":
+    os.chdir(tempfile.mkdtemp())
+    main([float(n) for n in sys.argv[1:]] or [0, 20, 100])
@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+"""Benchmark FileStorage.all(State) latency against total store size
+
+Usage: python3 -m benchmarks.file_storage_all [size ...]
+
+The store always holds 200 States; the rest of it is padded with
+BaseModel instances so only the total size changes between runs.
+The old key-scanning implementation is timed next to it for reference.
+"""
+import shlex
+import sys
+import timeit
+from benchmarks._common import reset
+from models import storage
+from models.base_model import BaseModel
+from models.state import State
+
+
+def scan_all(cls):
+    """all(cls) as it was before the per-class buckets"""
+    dic = {}
+    objects = storage.all()
+    for key in objects:
+        partition = shlex.split(key.replace('.', ' '))
+        if partition[0] == cls.__name__:
+            dic[key] = objects[key]
+    return dic
+
+
+def fill(size, states=200):
+    """Reset the in-memory store to `size` objects"""
+    reset()
+    for i in range(states):
+        storage.new(State(name="State_{}".format(i)))
+    for i in range(size - states):
+        storage.new(BaseModel())
+
+
+def main(sizes):
+    """Print a latency table, one row per store size"""
+    print("{:>10} {:>16} {:>16}".format(
+        "objects", "all(State) us", "key scan us"))
+    for size in sizes:
+        fill(size)
+        runs = 100
+        bucket = timeit.timeit(lambda: storage.all(State), number=runs)
+        scan = timeit.timeit(lambda: scan_all(State), number=1)
+        print("{:>10} {:>16.1f} {:>16.1f}".format(
+            size, bucket / runs * 1e6, scan * 1e6))
+
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [1000, 10000, 100000])
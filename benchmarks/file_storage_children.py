@@ -0,0 +1,44 @@
+#!/usr/bin/python3
+"""Benchmark State.cities in file storage mode
+
+Usage: python3 -m benchmarks.file_storage_children [size ...]
+
+Each size stores 50 States with that many Cities spread among them,
+plus as many Reviews, then times reading the cities of every State,
+which is what 8-cities_by_states.html renders.
+"""
+import os
+import sys
+import tempfile
+import time
+from benchmarks._common import reset
+from models.engine.file_storage import FileStorage
+from models.city import City
+from models.review import Review
+from models.state import State
+
+
+def main(sizes):
+    """Print a State.cities table, one row per store size"""
+    print("{:>10} {:>14}".format("objects", "all states ms"))
+    for size in sizes:
+        reset()
+        storage = FileStorage()
+        states = [State(name="State_{}".format(i)) for i in range(50)]
+        for state in states:
+            storage.new(state)
+        for i in range(size):
+            storage.new(City(name="City_{}".format(i),
+                             state_id=states[i % 50].id))
+            storage.new(Review(text="Great stay", place_id="p",
+                               user_id="u"))
+        start = time.perf_counter()
+        for state in states:
+            state.cities
+        print("{:>10} {:>14.2f}".format(
+            2 * size, (time.perf_counter() - start) * 1e3))
+
+
+if __name__ == "__main__":
+    os.chdir(tempfile.mkdtemp())
+    main([int(n) for n in sys.argv[1:]] or [1000, 10000, 100000])
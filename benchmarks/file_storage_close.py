@@ -0,0 +1,44 @@
+#!/usr/bin/python3
+"""Benchmark the FileStorage.close() every Flask request ends with
+
+Usage: python3 -m benchmarks.file_storage_close [size ...]
+
+Each size writes a store of that many States to a scratch directory,
+then times close() on the unchanged store against the full reload()
+it used to be.
+"""
+import os
+import sys
+import tempfile
+import time
+from benchmarks._common import reset
+from models.engine.file_storage import FileStorage
+from models.state import State
+
+ROUNDS = 20
+
+
+def timed(call):
+    """Milliseconds spent in one call, averaged over ROUNDS calls"""
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        call()
+    return (time.perf_counter() - start) * 1e3 / ROUNDS
+
+
+def main(sizes):
+    """Print a close() table, one row per store size"""
+    print("{:>10} {:>12} {:>12}".format("objects", "reload ms", "close ms"))
+    for size in sizes:
+        reset()
+        storage = FileStorage()
+        for i in range(size):
+            storage.new(State(name="State_{}".format(i)))
+        storage.save()
+        print("{:>10} {:>12.3f} {:>12.3f}".format(
+            size, timed(storage.reload), timed(storage.close)))
+
+
+if __name__ == "__main__":
+    os.chdir(tempfile.mkdtemp())
+    main([int(n) for n in sys.argv[1:]] or [100, 1000, 10000])
@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+"""Benchmark FileStorage cold start, eager against lazy reload
+
+Usage: python3 -m benchmarks.file_storage_cold_start [size ...]
+
+Each size writes a store of that many Reviews plus 200 States to a
+scratch directory, then times reload() followed by all(State) in a
+fresh process state, with and without HBNB_FILE_LAZY.
+"""
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+from benchmarks._common import reset
+from models.engine.file_storage import FileStorage
+from models.review import Review
+from models.state import State
+
+
+def cold_start(lazy):
+    """Seconds spent reloading the store and listing its States"""
+    reset()
+    with mock.patch.dict(os.environ, {"HBNB_FILE_LAZY": lazy}):
+        storage = FileStorage()
+        start = time.perf_counter()
+        storage.reload()
+        storage.all(State)
+        return time.perf_counter() - start
+
+
+def main(sizes):
+    """Print a cold start table, one row per store size"""
+    print("{:>10} {:>12} {:>12}".format("objects", "eager ms", "lazy ms"))
+    for size in sizes:
+        reset()
+        with mock.patch.dict(os.environ, {"HBNB_FILE_LAZY": "1"}):
+            storage = FileStorage()
+            for i in range(200):
+                storage.new(State(name="State_{}".format(i)))
+            for i in range(size):
+                storage.new(Review(text="Great stay", place_id="p",
+                                   user_id="u"))
+            storage.save()
+        eager = cold_start("0")
+        lazy = cold_start("1")
+        print("{:>10} {:>12.1f} {:>12.1f}".format(
+            size, eager * 1e3, lazy * 1e3))
+
+
+if __name__ == "__main__":
+    os.chdir(tempfile.mkdtemp())
+    main([int(n) for n in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+"""Benchmark the JSON and binary FileStorage formats
+
+Usage: python3 -m benchmarks.file_storage_formats [count]
+
+Writes `count` Places and as many Reviews in each format to a scratch
+directory, then reports the file size, the time to parse the file into
+records and the time of a full FileStorage.reload(), each the best of
+REPEAT runs.
+"""
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+from benchmarks._common import reset
+from models.engine import serializers
+from models.engine.file_storage import FileStorage
+from models.place import Place
+from models.review import Review
+
+REPEAT = 5
+
+
+def main(count):
+    """Print size and load times of both formats"""
+    print("{:>8} {:>12} {:>10} {:>10}".format(
+        "format", "bytes", "parse ms", "reload ms"))
+    for name in serializers.formats:
+        reset()
+        if os.path.exists("file.json"):
+            # The previous format's file would be merged into this one
+            os.remove("file.json")
+        with mock.patch.dict(os.environ, {"HBNB_FILE_FORMAT": name}):
+            storage = FileStorage()
+        for i in range(count):
+            place = Place(city_id="c", user_id="u", name="Place {}".format(i),
+                          number_rooms=i % 5, price_by_night=100 + i % 50,
+                          latitude=37.77, longitude=-122.41)
+            storage.new(place)
+            storage.new(Review(text="Great stay", place_id=place.id,
+                               user_id="u"))
+        storage.save()
+
+        with open("file.json", "rb") as f:
+            data = f.read()
+        parse = reload = float("inf")
+        for run in range(REPEAT):
+            start = time.perf_counter()
+            serializers.load(data)
+            parse = min(parse, time.perf_counter() - start)
+
+            reset()
+            start = time.perf_counter()
+            storage.reload()
+            reload = min(reload, time.perf_counter() - start)
+        print("{:>8} {:>12} {:>10.1f} {:>10.1f}".format(
+            name, len(data), parse * 1e3, reload * 1e3))
+
+
+if __name__ == "__main__":
+    os.chdir(tempfile.mkdtemp())
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
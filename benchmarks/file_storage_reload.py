@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+"""Benchmark FileStorage.reload throughput in objects per second
+
+Usage: python3 -m benchmarks.file_storage_reload [count]
+
+For every model class, a store of `count` instances is written to a
+scratch directory and reloaded, once through the class registry used
+by reload() and once the way it was done before, with eval() and
+BaseModel.__init__ for every record.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from benchmarks._common import reset
+from models.engine.file_storage import FileStorage, classes
+
+
+def legacy_reload(path):
+    """reload() as it was before the class registry"""
+    objects = {}
+    with open(path, 'r', encoding="UTF-8") as f:
+        for key, value in json.load(f).items():
+            objects[key] = eval(value["__class__"], dict(classes))(**value)
+    return objects
+
+
+def main(count):
+    """Print reload throughput for each model class"""
+    print("{:>10} {:>16} {:>16}".format(
+        "class", "registry obj/s", "eval obj/s"))
+    storage = FileStorage()
+    for name, cls in classes.items():
+        if name == "BaseModel":
+            continue
+        reset()
+        for i in range(count):
+            storage.new(cls(name="{}_{}".format(name, i)))
+        storage.save()
+
+        reset()
+        start = time.perf_counter()
+        storage.reload()
+        registry = time.perf_counter() - start
+
+        start = time.perf_counter()
+        legacy_reload("file.json")
+        legacy = time.perf_counter() - start
+        print("{:>10} {:>16.0f} {:>16.0f}".format(
+            name, count / registry, count / legacy))
+
+
+if __name__ == "__main__":
+    os.chdir(tempfile.mkdtemp())
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+"""Benchmark SQLiteStorage side by side with FileStorage
+
+Usage: python3 -m benchmarks.sqlite_storage [size ...]
+
+Each size fills a fresh store of either engine with that many Users
+and 100 States, then times:
+    create: new() and save() of one more State, 100 times
+    lookup: finding one State by key through all(State), 100 times
+    list: all(User)
+"""
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+from benchmarks._common import reset
+from models.engine.file_storage import FileStorage
+from models.engine.sqlite_storage import SQLiteStorage
+from models.state import State
+from models.user import User
+
+
+def fill(storage, size):
+    """Stores size Users and 100 States, returns the States"""
+    states = [State(name="State_{}".format(i)) for i in range(100)]
+    for obj in states:
+        storage.new(obj)
+    for i in range(size):
+        storage.new(User(email="user_{}@hbnb.io".format(i), password="pwd"))
+    storage.save()
+    return states
+
+
+def workloads(storage, size):
+    """Milliseconds per create, lookup and list call"""
+    states = fill(storage, size)
+    start = time.perf_counter()
+    for i in range(100):
+        storage.new(State(name="New_{}".format(i)))
+        storage.save()
+    create = (time.perf_counter() - start) * 10
+    start = time.perf_counter()
+    for state in states:
+        storage.all(State)['State.' + state.id]
+    lookup = (time.perf_counter() - start) * 10
+    start = time.perf_counter()
+    storage.all(User)
+    listing = (time.perf_counter() - start) * 1e3
+    return create, lookup, listing
+
+
+def main(sizes):
+    """Print a table, one row per engine and store size"""
+    print("{:>10} {:>8} {:>11} {:>11} {:>9}".format(
+        "objects", "engine", "create ms", "lookup ms", "list ms"))
+    for size in sizes:
+        reset()
+        engines = [("file", FileStorage())]
+        path = "hbnb_{}.db".format(size)
+        with mock.patch.dict(os.environ, {"HBNB_SQLITE_PATH": path}):
+            engines.append(("sqlite", SQLiteStorage()))
+        for name, storage in engines:
+            storage.reload()
+            print("{:>10} {:>8} {:>11.3f} {:>11.3f} {:>9.1f}".format(
+                size, name, *workloads(storage, size)))
+
+
+if __name__ == "__main__":
+    os.chdir(tempfile.mkdtemp())
+    main([int(n) for n in sys.argv[1:]] or [1000, 10000])
@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+"""Benchmark bulk_new()/bulk_save() against new() and save() per object
+
+Usage: python3 -m benchmarks.storage_bulk [size ...]
+
+Each size stores that many Reviews of one Place in a fresh FileStorage
+and SQLiteStorage, once through bulk_new() and bulk_save(), printing the
+rows per second they report, and once saving every Review on its own,
+which is timed on the first 1000 Reviews only.
+"""
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+from benchmarks._common import reset
+from models.engine.file_storage import FileStorage
+from models.engine.sqlite_storage import SQLiteStorage
+from models.city import City
+from models.place import Place
+from models.review import Review
+from models.state import State
+from models.user import User
+
+
+def fresh(engine, path):
+    """A reloaded storage of engine holding the Place of the Reviews"""
+    reset()
+    if os.path.exists("file.json"):
+        os.remove("file.json")
+    with mock.patch.dict(os.environ, {"HBNB_SQLITE_PATH": path}):
+        storage = engine()
+    storage.reload()
+    user = User(email="guest@hbnb.io", password="pwd")
+    state = State(name="California")
+    city = City(name="Fresno", state_id=state.id)
+    place = Place(name="Loft", city_id=city.id, user_id=user.id)
+    for obj in (user, state, city, place):
+        storage.new(obj)
+        storage.save()
+    return storage, place
+
+
+def reviews(place, size):
+    """size Reviews of place"""
+    return [Review(text="Great stay", place_id=place.id,
+                   user_id=place.user_id) for i in range(size)]
+
+
+def one_by_one(engine, size):
+    """Reviews per second saved one new() and save() at a time"""
+    storage, place = fresh(engine, "single_{}.db".format(size))
+    objs = reviews(place, min(size, 1000))
+    start = time.perf_counter()
+    for obj in objs:
+        storage.new(obj)
+        storage.save()
+    rate = len(objs) / (time.perf_counter() - start)
+    storage.close()
+    return rate
+
+
+def bulk(engine, size):
+    """Reviews per second bulk_save() reports"""
+    storage, place = fresh(engine, "bulk_{}.db".format(size))
+    storage.bulk_new(reviews(place, size))
+    report = storage.bulk_save()
+    storage.close()
+    return report["rows_per_second"]
+
+
+def main(sizes):
+    """Print a rows per second table, one row per engine and size"""
+    print("{:>10} {:>8} {:>14} {:>12}".format(
+        "objects", "engine", "one by one/s", "bulk/s"))
+    for size in sizes:
+        for name, engine in (("file", FileStorage),
+                             ("sqlite", SQLiteStorage)):
+            print("{:>10} {:>8} {:>14.0f} {:>12.0f}".format(
+                size, name, one_by_one(engine, size), bulk(engine, size)))
+
+
+if __name__ == "__main__":
+    os.chdir(tempfile.mkdtemp())
+    main([int(n) for n in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+"""Benchmark peak memory of all() against iter() on both engines
+
+Usage: python3 -m benchmarks.storage_iter [size ...]
+
+Each size stores that many Reviews in a lazy FileStorage and in a
+SQLiteStorage, then measures the memory allocated at peak while going
+through every Review, once with all(Review) and once with iter(Review),
+each from a freshly reloaded storage.
+"""
+import os
+import sys
+import tempfile
+import tracemalloc
+from unittest import mock
+from benchmarks._common import reset
+from models.engine.file_storage import FileStorage
+from models.engine.sqlite_storage import SQLiteStorage
+from models.city import City
+from models.place import Place
+from models.review import Review
+from models.state import State
+from models.user import User
+
+ENVIRON = {"HBNB_FILE_LAZY": "1", "HBNB_SQLITE_PATH": "hbnb.db"}
+
+
+def peak(engine, walk):
+    """MiB allocated at peak while walk(storage) goes through the
+    Reviews of a freshly reloaded storage"""
+    reset()
+    with mock.patch.dict(os.environ, ENVIRON):
+        storage = engine()
+    storage.reload()
+    tracemalloc.start()
+    for review in walk(storage):
+        review.text
+    size = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    storage.close()
+    return size / (1 << 20)
+
+
+def fill(storage, size):
+    """Stores size Reviews of one Place, with the rows they refer to"""
+    user = User(email="guest@hbnb.io", password="pwd")
+    state = State(name="California")
+    city = City(name="Fresno", state_id=state.id)
+    place = Place(name="Loft", city_id=city.id, user_id=user.id)
+    for obj in (user, state, city, place):
+        storage.new(obj)
+        storage.save()
+    for i in range(size):
+        storage.new(Review(text="Great stay", place_id=place.id,
+                           user_id=user.id))
+    storage.save()
+
+
+def main(sizes):
+    """Print a peak memory table, one row per engine and store size"""
+    print("{:>10} {:>8} {:>10} {:>10}".format(
+        "objects", "engine", "all MiB", "iter MiB"))
+    for size in sizes:
+        for name, engine in (("file", FileStorage),
+                             ("sqlite", SQLiteStorage)):
+            with mock.patch.dict(os.environ, ENVIRON):
+                storage = engine()
+            storage.reload()
+            fill(storage, size)
+            storage.close()
+            print("{:>10} {:>8} {:>10.1f} {:>10.1f}".format(
+                size, name,
+                peak(engine, lambda s: s.all(Review).values()),
+                peak(engine, lambda s: s.iter(Review))))
+
+
+if __name__ == "__main__":
+    os.chdir(tempfile.mkdtemp())
+    main([int(n) for n in sys.argv[1:]] or [10000, 50000])
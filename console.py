@@ -201,11 +201,11 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        key = c_name + "." + c_id
-        try:
-            print(storage.all()[key])
-        except KeyError:
+        obj = storage.get(c_name, c_id)
+        if obj is None:
             print("** no instance found **")
+        else:
+            print(obj)
 
     def help_show(self):
         """Help information for the show command"""
@@ -232,13 +232,13 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        key = c_name + "." + c_id
-
-        try:
-            storage.delete(storage.all()[key])
-            storage.save()
-        except KeyError:
+        obj = storage.get(c_name, c_id)
+        if obj is None:
             print("** no instance found **")
+            return
+
+        storage.delete(obj)
+        storage.save()
 
     def help_destroy(self):
         """Help information for the destroy command"""
@@ -247,21 +247,20 @@ class HBNBCommand(cmd.Cmd):
 
     def do_all(self, args):
         """Shows all objects, or all objects of a class"""
-        print_list = []
+        cls = None
 
         if args:
-            args = args.split(" ")[0]  # remove possible trailing args
-            if args not in HBNBCommand.classes:
+            cls = args.split(" ")[0]  # remove possible trailing args
+            if cls not in HBNBCommand.classes:
                 print("** class doesn't exist **")
                 return
-            for k, v in storage.all().items():
-                if k.split(".")[0] == args:
-                    print_list.append(str(v))
-        else:
-            for k, v in storage.all().items():
-                print_list.append(str(v))
 
-        print(print_list)
+        # print the list one object at a time, as print(list) would
+        separator = "["
+        for v in storage.iter(cls):
+            print(separator + repr(str(v)), end="")
+            separator = ", "
+        print("[]" if separator == "[" else "]")
 
     def help_all(self):
         """Help information for the all command"""
@@ -270,11 +269,7 @@ class HBNBCommand(cmd.Cmd):
 
     def do_count(self, args):
         """Count current number of class instances"""
-        count = 0
-        for k, v in storage.all().items():
-            if args == k.split(".")[0]:
-                count += 1
-        print(count)
+        print(storage.count(args))
 
     def help_count(self):
         """ """
@@ -303,11 +298,9 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        # generate key from class and id
-        key = c_name + "." + c_id
-
-        # determine if key is present
-        if key not in storage.all():
+        # retrieve the object from its class and id
+        new_dict = storage.get(c_name, c_id)
+        if new_dict is None:
             print("** no instance found **")
             return
 
@@ -344,9 +337,6 @@ class HBNBCommand(cmd.Cmd):
 
             args = [att_name, att_val]
 
-        # retrieve dictionary of current objects
-        new_dict = storage.all()[key]
-
         # iterate through attr names and values
         for i, att_name in enumerate(args):
             # block only runs on even iterations
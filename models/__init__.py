@@ -4,6 +4,7 @@
 # Import necessary modules and classes
 from models.engine.file_storage import FileStorage
 from models.engine.db_storage import DBStorage
+from models.engine.sqlite_storage import SQLiteStorage
 from models.base_model import BaseModel
 from models.user import User
 from models.state import State
@@ -17,9 +18,33 @@ from os import getenv
 if getenv("HBNB_TYPE_STORAGE") == "db":
     # If set to "db", create an instance of DBStorage
     storage = DBStorage()
+elif getenv("HBNB_TYPE_STORAGE") == "sqlite":
+    # If set to "sqlite", create an instance of SQLiteStorage
+    storage = SQLiteStorage()
 else:
     # Default to creating an instance of FileStorage
     storage = FileStorage()
 
-# Reload the storage instance to load data from the storage system
+# Reload the storage instance to load data from the storage system;
+# this also creates the tables async_storage works on
 storage.reload()
+
+
+def __getattr__(name):
+    """Creates async_storage, the awaitable counterpart of storage, on
+    first use, so that only the code awaiting storage needs the asyncio
+    drivers"""
+    global async_storage
+    if name != "async_storage":
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(__name__, name))
+    if getenv("HBNB_TYPE_STORAGE") == "db":
+        from models.engine.async_db_storage import AsyncDBStorage
+        async_storage = AsyncDBStorage()
+    elif getenv("HBNB_TYPE_STORAGE") == "sqlite":
+        from models.engine.async_sqlite_storage import AsyncSQLiteStorage
+        async_storage = AsyncSQLiteStorage()
+    else:
+        from models.engine.async_file_storage import AsyncFileStorage
+        async_storage = AsyncFileStorage(storage)
+    return async_storage
@@ -13,5 +13,5 @@ class Amenity(BaseModel, Base):
     """
     __tablename__ = "amenities"
     
-    name = Column(String(128), nullable=False)
+    name = Column(String(128), nullable=False, index=True)
     place_amenities = relationship("Place", secondary=place_amenity)
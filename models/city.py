@@ -16,8 +16,9 @@ class City(BaseModel, Base):
         places: relationship to Place class
     """
     __tablename__ = "cities"
-    name = Column(String(128), nullable=False)
-    state_id = Column(String(60), ForeignKey('states.id'), nullable=False)
+    name = Column(String(128), nullable=False, index=True)
+    state_id = Column(String(60), ForeignKey('states.id'), nullable=False,
+                      index=True)
 
     # Define a one-to-many relationship between City and Place
     places = relationship("Place", cascade='all, delete, delete-orphan',
@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+"""
+Contains the class AsyncDBStorage
+"""
+
+import asyncio
+from models.base_model import Base
+from models.engine import migrations
+from models.engine.db_storage import classes, load_options, \
+    pool_options
+from os import getenv
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session, \
+    create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+
+def async_pool_options():
+    """return the create_async_engine() pool arguments: those of
+    pool_options(), or a connection per session if HBNB_DB_ASYNC_POOL
+    is "0" """
+    if getenv('HBNB_DB_ASYNC_POOL') == "0":
+        return {"poolclass": NullPool}
+    options = pool_options()
+    # The async engines need an asyncio aware QueuePool
+    options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+
+class AsyncDBStorage:
+    """interacts with the MySQL database through asyncio, so that a
+    coroutine waiting for a query leaves the event loop to others"""
+    __engine = None
+    __session = None
+
+    def __init__(self, engine=None):
+        """Instantiate an AsyncDBStorage object on the HBNB_MYSQL_*
+        database, or on the AsyncEngine engine. Each asyncio task has
+        a session of its own.
+        Environment:
+            HBNB_DB_ASYNC_POOL: "0" opens a connection per session, for
+                callers running each task in an event loop of their own,
+                as pooled connections cannot move between loops (default
+                "1", pooled as pool_options() describes)
+        """
+        if engine is None:
+            engine = create_async_engine('mysql+aiomysql://{}:{}@{}/{}'.
+                                         format(getenv('HBNB_MYSQL_USER'),
+                                                getenv('HBNB_MYSQL_PWD'),
+                                                getenv('HBNB_MYSQL_HOST'),
+                                                getenv('HBNB_MYSQL_DB')),
+                                         **async_pool_options())
+        self.__engine = engine
+        factory = sessionmaker(engine, class_=AsyncSession,
+                               expire_on_commit=False)
+        self.__session = async_scoped_session(
+            factory, scopefunc=asyncio.current_task)
+
+    @staticmethod
+    def __class(cls):
+        """return the class cls names, or cls itself"""
+        return classes[cls] if type(cls) is str else cls
+
+    async def all(self, cls=None):
+        """query on the current database session"""
+        new_dict = {}
+        for clss in classes.values():
+            if cls is None or cls is clss or cls == clss.__name__:
+                result = await self.__session.execute(select(clss))
+                for obj in result.scalars():
+                    new_dict[clss.__name__ + '.' + obj.id] = obj
+        return new_dict
+
+    async def get(self, cls, id, load=None):
+        """return the object of cls with this id, or None, with the
+        relationships of load eagerly loaded, since lazy loads are not
+        possible under asyncio"""
+        if type(cls) is str and cls not in classes:
+            return None
+        cls = self.__class(cls)
+        return await self.__session.get(cls, id,
+                                        options=load_options(cls, load))
+
+    async def count(self, cls=None):
+        """count the rows of cls, or of every class, in SQL"""
+        if cls is None:
+            return sum([await self.count(clss) for clss in classes.values()])
+        if type(cls) is str and cls not in classes:
+            return 0
+        cls = self.__class(cls)
+        return await self.__session.scalar(select(func.count(cls.id)))
+
+    async def query(self, cls, where=None, order_by=None, limit=None,
+                    offset=0, load=None):
+        """query the objects of cls as DBStorage.query() does"""
+        if type(cls) is str and cls not in classes:
+            return []
+        cls = self.__class(cls)
+        statement = select(cls).options(*load_options(cls, load))
+        if where:
+            statement = statement.filter_by(**where)
+        if order_by:
+            column = getattr(cls, order_by.lstrip('-'))
+            if order_by.startswith('-'):
+                column = column.desc()
+            statement = statement.order_by(column)
+        if offset:
+            statement = statement.offset(offset)
+        if limit is not None:
+            statement = statement.limit(limit)
+        result = await self.__session.execute(statement)
+        return list(result.scalars())
+
+    async def new(self, obj):
+        """add the object to the current database session"""
+        self.__session.add(obj)
+
+    async def save(self):
+        """commit all changes of the current database session"""
+        await self.__session.commit()
+
+    async def delete(self, obj=None):
+        """delete from the current database session obj if not None"""
+        if obj is not None:
+            await self.__session.delete(obj)
+
+    async def reload(self):
+        """creates the tables missing from the database and migrates
+        the others"""
+        async with self.__engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+            await connection.run_sync(migrations.upgrade)
+
+    async def close(self):
+        """closes the session of the current task, to be awaited before
+        its event loop ends"""
+        await self.__session.remove()
+
+    async def dispose(self):
+        """closes the pooled connections, to be awaited before the event
+        loop they were opened in ends"""
+        await self.__engine.dispose()
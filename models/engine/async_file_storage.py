@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+"""
+Contains the class AsyncFileStorage
+"""
+
+import asyncio
+
+
+class AsyncFileStorage:
+    """Awaitable interface of a FileStorage, for the code written
+    against AsyncDBStorage. Its objects live in memory, only the
+    methods reading or writing files run in a thread, off the event
+    loop."""
+
+    def __init__(self, storage):
+        """Instantiate an AsyncFileStorage object on storage"""
+        self.__storage = storage
+
+    async def all(self, cls=None):
+        """Returns the dictionary of objects of cls, or of every class"""
+        return self.__storage.all(cls)
+
+    async def get(self, cls, id, load=None):
+        """Returns the object of cls with this id, or None"""
+        return self.__storage.get(cls, id, load)
+
+    async def count(self, cls=None):
+        """Returns the number of objects of cls, or of every class"""
+        return self.__storage.count(cls)
+
+    async def query(self, cls, where=None, order_by=None, limit=None,
+                    offset=0, load=None):
+        """Returns the objects of cls as FileStorage.query() does"""
+        return self.__storage.query(cls, where, order_by, limit, offset,
+                                    load)
+
+    async def new(self, obj):
+        """Adds a new instance to the dictionary"""
+        self.__storage.new(obj)
+
+    async def save(self):
+        """Saves the instances to the file"""
+        await asyncio.to_thread(self.__storage.save)
+
+    async def delete(self, obj=None):
+        """Deletes obj from the dictionary"""
+        self.__storage.delete(obj)
+
+    async def reload(self):
+        """Reads the instances from the file"""
+        await asyncio.to_thread(self.__storage.reload)
+
+    async def close(self):
+        """Catches up with the changes saved by other processes"""
+        await asyncio.to_thread(self.__storage.close)
+
+    async def dispose(self):
+        """Nothing is pooled, so nothing is closed"""
@@ -0,0 +1,33 @@
+#!/usr/bin/python3
+"""
+Contains the class AsyncSQLiteStorage
+"""
+
+from models.engine.async_db_storage import AsyncDBStorage, \
+    async_pool_options
+from models.engine.sqlite_storage import PRAGMAS
+from os import getenv
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+
+
+class AsyncSQLiteStorage(AsyncDBStorage):
+    """interacts with an SQLite database file through aiosqlite, as
+    AsyncDBStorage does with MySQL"""
+
+    def __init__(self):
+        """Instantiate an AsyncSQLiteStorage object on the database file
+        HBNB_SQLITE_PATH (default hbnb.db)"""
+        path = getenv('HBNB_SQLITE_PATH', 'hbnb.db')
+        engine = create_async_engine('sqlite+aiosqlite:///{}'.format(path),
+                                     **async_pool_options())
+        event.listen(engine.sync_engine, "connect", self.__set_pragmas)
+        super().__init__(engine)
+
+    @staticmethod
+    def __set_pragmas(connection, record):
+        """Sets PRAGMAS on a new connection"""
+        cursor = connection.cursor()
+        for pragma in PRAGMAS:
+            cursor.execute("PRAGMA " + pragma)
+        cursor.close()
@@ -4,53 +4,433 @@ Contains the class DBStorage
 """
 
 import models
+from concurrent.futures import ThreadPoolExecutor
 from models.amenity import Amenity
 from models.base_model import BaseModel, Base
 from models.city import City
+from models.engine import migrations, result_cache
 from models.place import Place
 from models.review import Review
 from models.state import State
 from models.user import User
 from os import getenv
 import sqlalchemy
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+import threading
+import time
+from itertools import chain, cycle
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.orm import Session, scoped_session, selectinload, \
+    sessionmaker
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.expression import UpdateBase
 
 classes = {"Amenity": Amenity, "City": City,
            "Place": Place, "Review": Review, "State": State, "User": User}
 
 
+class StatsQueuePool(QueuePool):
+    """QueuePool that also counts its checkouts and the time spent
+    waiting for, or opening, the connections they got"""
+
+    def __init__(self, *args, **kwargs):
+        """Instantiate the pool with its counters at zero"""
+        super().__init__(*args, **kwargs)
+        self.__lock = threading.Lock()
+        self.checkouts = 0
+        self.wait = 0.0
+        self.wait_max = 0.0
+
+    def connect(self):
+        """Check a connection out, timing how long it took"""
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            wait = time.perf_counter() - start
+            with self.__lock:
+                self.checkouts += 1
+                self.wait += wait
+                self.wait_max = max(self.wait_max, wait)
+
+
+class RoutingSession(Session):
+    """Session reading from the replica engines of info["replicas"], in
+    turn, and writing to its bind, the primary. Once it has written, or
+    once info["primary"] is set, it reads from the primary as well, so
+    that it sees its own writes whatever the replication lag."""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        """Returns the engine mapper or clause is run on"""
+        replicas = self.info.get("replicas")
+        if replicas is None or self._flushing or \
+                self.info.get("primary") or isinstance(clause, UpdateBase):
+            return super().get_bind(mapper, clause, **kwargs)
+        return next(replicas)
+
+
+def load_options(cls, load):
+    """return the loader options eagerly loading each relationship path
+    of load, such as "cities" or "places.reviews", one SELECT ... IN
+    query per relationship rather than one per parent"""
+    options = []
+    for path in load or ():
+        option, clss = None, cls
+        for name in path.split('.'):
+            attribute = getattr(clss, name)
+            option = selectinload(attribute) if option is None \
+                else option.selectinload(attribute)
+            clss = attribute.property.mapper.class_
+        options.append(option)
+    return options
+
+
+def pool_options():
+    """return the create_engine() pool arguments the environment sets:
+        HBNB_DB_POOL_SIZE: connections kept open (default 5)
+        HBNB_DB_POOL_OVERFLOW: connections opened on top of those under
+            load (default 10)
+        HBNB_DB_POOL_TIMEOUT: seconds to wait for a connection before
+            giving up (default 30)
+        HBNB_DB_POOL_RECYCLE: seconds after which a connection is
+            replaced, below the server wait_timeout (default 3600)
+        HBNB_DB_POOL_PRE_PING: "1" tests connections as they are checked
+            out and replaces the stale ones (default "1")
+    """
+    return {"poolclass": StatsQueuePool,
+            "pool_size": int(getenv('HBNB_DB_POOL_SIZE', 5)),
+            "max_overflow": int(getenv('HBNB_DB_POOL_OVERFLOW', 10)),
+            "pool_timeout": float(getenv('HBNB_DB_POOL_TIMEOUT', 30)),
+            "pool_recycle": int(getenv('HBNB_DB_POOL_RECYCLE', 3600)),
+            "pool_pre_ping": getenv('HBNB_DB_POOL_PRE_PING', "1") == "1"}
+
+
 class DBStorage:
     """interaacts with the MySQL database"""
     __engine = None
     __session = None
+    __factory = None
 
-    def __init__(self):
-        """Instantiate a DBStorage object"""
+    def __init__(self, engine=None, cache=None, replicas=None):
+        """Instantiate a DBStorage object
+        Args:
+            engine: engine to use instead of the MySQL one the
+                HBNB_MYSQL_* variables and pool_options() describe
+            cache: result cache backend, as result_cache describes, to
+                use instead of the one HBNB_DB_CACHE names
+            replicas: engines to read from instead of those of the
+                HBNB_MYSQL_REPLICA_HOSTS
+        Environment:
+            HBNB_MYSQL_REPLICA_HOSTS: comma separated hosts of read
+                replicas of the HBNB_MYSQL_DB database, read from in
+                turn by sessions that did not write (default none, all
+                reads on the primary)
+            HBNB_DB_ALL_WORKERS: threads all() queries the classes with,
+                each on its own pooled connection (default 0, all the
+                classes one after another on the session connection)
+            HBNB_DB_CACHE: result cache backend of query(), get() and
+                count(), "lru" (default none, no cache)
+            HBNB_DB_CACHE_SIZE: results the cache holds (default 1024)
+            HBNB_DB_CACHE_TTL: seconds a result is kept, which bounds
+                how long changes committed by other processes go
+                unnoticed (default 60)
+        """
         HBNB_MYSQL_USER = getenv('HBNB_MYSQL_USER')
         HBNB_MYSQL_PWD = getenv('HBNB_MYSQL_PWD')
         HBNB_MYSQL_HOST = getenv('HBNB_MYSQL_HOST')
         HBNB_MYSQL_DB = getenv('HBNB_MYSQL_DB')
         HBNB_ENV = getenv('HBNB_ENV')
-        self.__engine = create_engine('mysql+mysqldb://{}:{}@{}/{}'.
+        if engine is None:
+            engine = create_engine('mysql+mysqldb://{}:{}@{}/{}'.
+                                   format(HBNB_MYSQL_USER,
+                                          HBNB_MYSQL_PWD,
+                                          HBNB_MYSQL_HOST,
+                                          HBNB_MYSQL_DB),
+                                   **pool_options())
+        if replicas is None:
+            replicas = [create_engine('mysql+mysqldb://{}:{}@{}/{}'.
                                       format(HBNB_MYSQL_USER,
                                              HBNB_MYSQL_PWD,
-                                             HBNB_MYSQL_HOST,
-                                             HBNB_MYSQL_DB))
+                                             host,
+                                             HBNB_MYSQL_DB),
+                                      **pool_options())
+                        for host in getenv('HBNB_MYSQL_REPLICA_HOSTS',
+                                           '').split(',') if host]
+        self.__engine = engine
+        self.__replicas = replicas
+        self.__workers = int(getenv('HBNB_DB_ALL_WORKERS', 0))
+        self.__pool = None
+        self.__timings = {}
+        self.__bulk = []
+        self.__bulk_seconds = 0.0
+        if cache is None and getenv('HBNB_DB_CACHE'):
+            cache = result_cache.backends[getenv('HBNB_DB_CACHE')](
+                size=int(getenv('HBNB_DB_CACHE_SIZE', 1024)),
+                ttl=float(getenv('HBNB_DB_CACHE_TTL', 60)))
+        self.__cache = cache
+        self.__generations = dict.fromkeys(classes, 0)
+        self.__hits = 0
+        self.__misses = 0
+        self.__cache_lock = threading.Lock()
         if HBNB_ENV == "test":
             Base.metadata.drop_all(self.__engine)
 
     def all(self, cls=None):
-        """query on the current database session"""
+        """query on the current database session; with
+        HBNB_DB_ALL_WORKERS the classes are queried concurrently and
+        their rows attached to the session"""
+        start = time.perf_counter()
+        queried = [classes[clss] for clss in classes
+                   if cls is None or cls is classes[clss] or cls == clss]
+        session = self.__session
+        if self.__workers and len(queried) > 1 and \
+                not (session.new or session.dirty or session.deleted):
+            # Other connections do not see unflushed changes, hence
+            # the concurrent queries only run on a clean session
+            if self.__pool is None:
+                self.__pool = ThreadPoolExecutor(max_workers=self.__workers)
+            primary = session.info.get("primary", False)
+            results = list(self.__pool.map(
+                lambda clss: self.__query_apart(clss, primary), queried))
+            results = [(clss, [self.__attach(session, obj)
+                               for obj in objs], seconds)
+                       for clss, objs, seconds in results]
+        else:
+            results = [self.__query(session, clss) for clss in queried]
+
         new_dict = {}
-        for clss in classes:
-            if cls is None or cls is classes[clss] or cls is clss:
-                objs = self.__session.query(classes[clss]).all()
-                for obj in objs:
-                    key = obj.__class__.__name__ + '.' + obj.id
-                    new_dict[key] = obj
+        self.__timings = {}
+        for clss, objs, seconds in results:
+            self.__timings[clss.__name__] = seconds
+            for obj in objs:
+                key = obj.__class__.__name__ + '.' + obj.id
+                new_dict[key] = obj
+        self.__timings["total"] = time.perf_counter() - start
         return (new_dict)
 
+    def pool_stats(self):
+        """return the figures of the connection pool: connections kept
+        open, checked in, checked out and opened on top of those, then
+        the checkouts so far and the seconds they waited in all and at
+        most"""
+        pool = self.__engine.pool
+        stats = {}
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), checked_in=pool.checkedin(),
+                         checked_out=pool.checkedout(),
+                         overflow=max(0, pool.overflow()))
+        if isinstance(pool, StatsQueuePool):
+            stats.update(checkouts=pool.checkouts, wait=pool.wait,
+                         wait_max=pool.wait_max)
+        return stats
+
+    def cache_stats(self):
+        """return the hits and misses of the result cache, the results
+        it holds and, for an LRUCache, those it evicted"""
+        stats = {"hits": self.__hits, "misses": self.__misses}
+        if self.__cache is not None:
+            stats["entries"] = len(self.__cache)
+            stats["evictions"] = getattr(self.__cache, "evictions", 0)
+        return stats
+
+    def __cached(self, key, clss, fetch, load=None):
+        """return the result under key, from the cache or else from
+        fetch() and then stored. The key holds the generation of each
+        of the classes clss it depends on, so that a change to any of
+        them leaves it behind. Cached instances are merged into the
+        session without SQL, as each session needs instances of its
+        own, and their relationships load did not name are expired:
+        those lazy loaded since they were cached are not covered by
+        the key."""
+        if self.__cache is None:
+            return fetch()
+        session = self.__session
+        if session.new or session.dirty or session.deleted:
+            # As autoflush would, which a cache hit skips
+            session.flush()
+        key = key + tuple(self.__generations.get(related.__name__, 0)
+                          for related in clss)
+        value = self.__cache.get(key)
+        if value is not None:
+            try:
+                if isinstance(value, list):
+                    value = [self.__merge(session, obj, load)
+                             for obj in value]
+                elif isinstance(value, Base):
+                    value = self.__merge(session, value, load)
+                with self.__cache_lock:
+                    self.__hits += 1
+                return value
+            except sqlalchemy.exc.InvalidRequestError:
+                # Changed in the session that cached it, not flushed yet
+                pass
+        with self.__cache_lock:
+            self.__misses += 1
+        value = fetch()
+        self.__cache.set(key, value)
+        return value
+
+    @staticmethod
+    def __merge(session, obj, load):
+        """return the instance of the session for the cached obj, its
+        relationships out of load expired"""
+        obj = session.merge(obj, load=False)
+        loaded = {path.split('.')[0] for path in load or ()}
+        names = [name for name in
+                 sqlalchemy.inspect(type(obj)).relationships.keys()
+                 if name not in loaded]
+        if names:
+            # An empty list would expire every attribute
+            session.expire(obj, names)
+        return obj
+
+    def __invalidate(self, names):
+        """leave behind the cached results of the classes called names"""
+        if self.__cache is None:
+            return
+        with self.__cache_lock:
+            for name in names:
+                self.__generations[name] = \
+                    self.__generations.get(name, 0) + 1
+        for name in names:
+            self.__cache.invalidate(name)
+
+    def __flushed(self, session, context):
+        """after_flush: invalidate the classes of the flushed instances
+        and once more when their transaction ends"""
+        names = {type(obj).__name__ for obj in
+                 chain(session.new, session.dirty, session.deleted)}
+        session.info.setdefault("changed", set()).update(names)
+        # Reads from now on see the writes of the session
+        session.info["primary"] = True
+        self.__invalidate(names)
+
+    def __ended(self, session):
+        """after_commit, after_rollback: invalidate the classes flushed
+        during the transaction, which other sessions may have cached
+        meanwhile"""
+        self.__invalidate(session.info.pop("changed", ()))
+
+    def timings(self):
+        """return the seconds the last all() spent querying each class,
+        with its wall clock time under the "total" key"""
+        return dict(self.__timings)
+
+    @staticmethod
+    def __query(session, cls):
+        """return cls, its rows and the seconds the query took"""
+        start = time.perf_counter()
+        objs = session.query(cls).all()
+        return cls, objs, time.perf_counter() - start
+
+    @staticmethod
+    def __attach(session, obj):
+        """return the instance of the session for the detached obj: the
+        one it already holds, as a query would, or else obj itself"""
+        key = sqlalchemy.inspect(obj).key
+        held = session.identity_map.get(key)
+        if held is not None:
+            return held
+        session.add(obj)
+        return obj
+
+    def __query_apart(self, cls, primary=False):
+        """__query on a session of its own, closed once done, reading
+        from the primary if primary"""
+        session = self.__factory()
+        session.info["primary"] = primary
+        try:
+            return self.__query(session, cls)
+        finally:
+            session.close()
+
+    @staticmethod
+    def __related(cls, load):
+        """return cls and the classes the relationship paths of load
+        lead to"""
+        clss = [cls]
+        for path in load or ():
+            target = cls
+            for name in path.split('.'):
+                target = getattr(target, name).property.mapper.class_
+                clss.append(target)
+        return clss
+
+    def get(self, cls, id, load=None):
+        """return the object of cls with this id, or None, with the
+        relationships of load eagerly loaded; the session identity map
+        answers without SQL once it was loaded"""
+        if type(cls) is str:
+            if cls not in classes:
+                return None
+            cls = classes[cls]
+        return self.__cached(
+            (cls.__name__, "get", id, tuple(load or ())),
+            self.__related(cls, load),
+            lambda: self.__session.get(cls, id,
+                                       options=load_options(cls, load)),
+            load)
+
+    def count(self, cls=None):
+        """count the rows of cls, or of every class, in SQL"""
+        if cls is None:
+            return sum(self.count(clss) for clss in classes.values())
+        if type(cls) is str:
+            if cls not in classes:
+                return 0
+            cls = classes[cls]
+        return self.__cached(
+            (cls.__name__, "count"), [cls],
+            lambda: self.__session.query(func.count(cls.id)).scalar())
+
+    def iter(self, cls=None, batch_size=1000):
+        """yield the objects of cls, or of every class, fetching
+        batch_size rows at a time through a server side cursor"""
+        if cls is None:
+            clss = classes.values()
+        elif type(cls) is str:
+            clss = [classes[cls]] if cls in classes else []
+        else:
+            clss = [cls]
+        for cls in clss:
+            query = self.__session.query(cls)
+            yield from query.yield_per(batch_size)
+
+    def query(self, cls, where=None, order_by=None, limit=None, offset=0,
+              load=None):
+        """query the objects of cls whose columns equal the values of
+        the where dictionary, sorted on the order_by column ("-name"
+        sorts in descending order), skipping the first offset rows and
+        returning at most limit of them, with the relationships of load
+        eagerly loaded"""
+        if type(cls) is str:
+            if cls not in classes:
+                return []
+            cls = classes[cls]
+        return self.__cached(
+            (cls.__name__, "query", tuple(sorted((where or {}).items())),
+             order_by, limit, offset, tuple(load or ())),
+            self.__related(cls, load),
+            lambda: self.__query_all(cls, where, order_by, limit, offset,
+                                     load),
+            load)
+
+    def __query_all(self, cls, where, order_by, limit, offset, load):
+        """run the SQL query of query()"""
+        query = self.__session.query(cls).options(
+            *load_options(cls, load))
+        if where:
+            query = query.filter_by(**where)
+        if order_by:
+            column = getattr(cls, order_by.lstrip('-'))
+            if order_by.startswith('-'):
+                column = column.desc()
+            query = query.order_by(column)
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
     def new(self, obj):
         """add the object to the current database session"""
         self.__session.add(obj)
@@ -59,15 +439,69 @@ class DBStorage:
         """commit all changes of the current database session"""
         self.__session.commit()
 
+    def bulk_new(self, objs):
+        """queue the objects for the next bulk_save(), outside of the
+        session"""
+        start = time.perf_counter()
+        self.__bulk.extend(objs)
+        self.__bulk_seconds += time.perf_counter() - start
+
+    def bulk_save(self):
+        """insert the objects queued by bulk_new(), one executemany
+        INSERT per table, parents first, and commit them with the
+        changes of the session; return the rows inserted, the seconds
+        spent queueing them in bulk_new() and inserting them here, with
+        the flush of the session, and the rows per second.
+        Their relationships, such as Place.amenities, are not saved and
+        the objects are not attached to the session."""
+        start = time.perf_counter()
+        objs, self.__bulk = self.__bulk, []
+        self.__session.flush()
+        self.__session.info["primary"] = True
+        tables = {}
+        for obj in objs:
+            tables.setdefault(obj.__table__, []).append(obj)
+        for table in Base.metadata.sorted_tables:
+            if table in tables:
+                mapper = sqlalchemy.inspect(tables[table][0].__class__)
+                keys = [column.key for column in mapper.column_attrs]
+                self.__session.bulk_insert_mappings(
+                    mapper, [{key: getattr(obj, key) for key in keys}
+                             for obj in tables[table]])
+        self.__session.commit()
+        self.__invalidate({obj.__class__.__name__ for obj in objs})
+        seconds = self.__bulk_seconds + time.perf_counter() - start
+        self.__bulk_seconds = 0.0
+        return {"rows": len(objs), "seconds": seconds,
+                "rows_per_second": len(objs) / seconds if seconds else 0.0}
+
     def delete(self, obj=None):
         """delete from the current database session obj if not None"""
         if obj is not None:
             self.__session.delete(obj)
 
+    def use_primary(self):
+        """read from the primary until the current session is closed,
+        as sessions do once they wrote"""
+        self.__session.info["primary"] = True
+
     def reload(self):
-        """reloads data from the database"""
+        """reloads data from the database, after creating the tables
+        missing and migrating the others; the replicas get them through
+        replication"""
         Base.metadata.create_all(self.__engine)
-        sess_factory = sessionmaker(bind=self.__engine, expire_on_commit=False)
+        with self.__engine.begin() as connection:
+            migrations.upgrade(connection)
+        info = {"replicas": cycle(self.__replicas)} if self.__replicas \
+            else {}
+        sess_factory = sessionmaker(bind=self.__engine, expire_on_commit=False,
+                                    class_=RoutingSession, info=info)
+        self.__factory = sess_factory
+        event.listen(sess_factory, "after_flush", self.__flushed)
+        event.listen(sess_factory, "after_commit", self.__ended)
+        event.listen(sess_factory, "after_rollback", self.__ended)
+        if self.__cache is not None:
+            self.__cache.clear()
         Session = scoped_session(sess_factory)
         self.__session = Session
 
@@ -2,7 +2,22 @@
 """This is the file storage class for AirBnB"""
 
 # Import necessary modules and classes
+import atexit
+import fcntl
+import heapq
 import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+from os import getenv
 from models.base_model import BaseModel
 from models.user import User
 from models.state import State
@@ -10,71 +25,1110 @@ from models.city import City
 from models.amenity import Amenity
 from models.place import Place
 from models.review import Review
-import shlex
+from models.engine import serializers
+from sqlalchemy import event
+from sqlalchemy.orm import configure_mappers
+from sqlalchemy.orm.instrumentation import manager_of_class
+
+logger = logging.getLogger(__name__)
+
+classes = {"BaseModel": BaseModel, "User": User, "State": State,
+           "City": City, "Amenity": Amenity, "Place": Place,
+           "Review": Review}
+
+# Foreign key attributes of each class, indexed to find the children
+# of an instance without going through every object
+foreign_keys = {"City": ("state_id",), "Place": ("city_id", "user_id"),
+                "Review": ("place_id", "user_id")}
+
 
 class FileStorage:
     """This class serializes instances to a JSON file and
     deserializes JSON file to instances
+    Processes sharing the file take a lock file next to it, shared to
+    read and exclusive to write, and merge what the others saved
+    before writing, so that only their own changes overwrite it.
+    Reading the files back builds new dictionaries without holding
+    __lock and swaps them in, so that readers never wait on a parse.
     Attributes:
         __file_path: path to the JSON file
         __objects: dictionary to store instances
+        __classes: per-class buckets of __objects, keyed by class name
+        __shared: class names of the buckets, and None for __objects,
+            that all() handed out since they last changed; those are
+            copied before their next change instead of changed in place
+        __dirty: keys added or deleted since the last save
+        __unloaded: per-class {key: [offset, length]} of the records
+            still waiting in the mapped JSON file in lazy mode
+        __mapped: memory map of the JSON file the offsets point into
+        __dirty_shards: shards touched since they were last written
+        __lock: guards the attributes above against the flusher thread;
+            held briefly, never while files are read or parsed
+        __write_lock: serializes writes to the files, taken before __lock
+        __constructors: class name -> callable returning a blank instance
+        __children: (class name, foreign key) -> parent id -> {key: obj}
+        __parents: key -> {foreign key: parent id} it is indexed under
     """
     # Class variables for the file path and objects
     __file_path = "file.json"
     __objects = {}
+    __classes = {}
+    __shared = set()
+    __dirty = set()
+    __unloaded = {}
+    __mapped = None
+    __dirty_shards = set()
+    __lock = threading.RLock()
+    __write_lock = threading.RLock()
+    __constructors = {}
+    __children = {}
+    __parents = {}
 
-    def all(self, cls=None):
-        """Returns a dictionary of objects filtered by class"""
-        dic = {}
+    def __init__(self):
+        """Reads the persistence options from the environment
+        HBNB_FILE_JOURNAL: "1" appends changes to a journal on save
+        HBNB_FILE_JOURNAL_MAX: journal size in bytes below which it is
+            never compacted (default 1 MiB)
+        HBNB_FILE_WRITE_BEHIND: "1" makes save() return at once and leaves
+            the write to a background thread
+        HBNB_FILE_FLUSH_INTERVAL: seconds the thread gathers saves before
+            writing them all at once (default 1)
+        HBNB_FILE_FLUSH_DIRTY: number of changed keys that has the thread
+            write before the interval is over (default 0, no limit)
+        HBNB_FILE_COMMIT_WINDOW: same as HBNB_FILE_WRITE_BEHIND with this
+            flush interval, when above 0 (default 0)
+        HBNB_FILE_LAZY: "1" keeps an offset index next to the JSON file
+            and only builds the instances of a class once it is used
+        HBNB_FILE_SHARDED: "1" stores each class in its own file of the
+            <file>.d directory and only rewrites the shards that changed;
+            it takes over from the lazy mode. Turning it on or off reads
+            whichever of the two layouts was saved last, and moves it to
+            the other on the next save
+        HBNB_FILE_SHARD_BUCKETS: hash buckets for large classes in the
+            sharded mode, as "Review:16,Place:4" (default 1 per class)
+        HBNB_FILE_SHARD_WORKERS: threads reading shards on reload
+        HBNB_FILE_FORMAT: "json" (default) or "binary", the format files
+            are written in; reading recognizes either of them. The lazy
+            mode needs "json"
+        """
+        self.__journal = getenv("HBNB_FILE_JOURNAL") == "1"
+        self.__journal_max = int(getenv("HBNB_FILE_JOURNAL_MAX", 1 << 20))
+        self.__journal_path = self.__file_path + ".journal"
+        self.__write_behind = getenv("HBNB_FILE_WRITE_BEHIND") == "1"
+        self.__interval = float(getenv("HBNB_FILE_FLUSH_INTERVAL", 1))
+        self.__max_dirty = int(getenv("HBNB_FILE_FLUSH_DIRTY", 0))
+        window = float(getenv("HBNB_FILE_COMMIT_WINDOW", 0))
+        if window > 0:
+            self.__write_behind = True
+            self.__interval = window
+        self.__sharded = getenv("HBNB_FILE_SHARDED") == "1"
+        self.__shard_path = self.__file_path + ".d"
+        self.__buckets = {}
+        for spec in getenv("HBNB_FILE_SHARD_BUCKETS", "").split(","):
+            if spec:
+                name, count = spec.split(":")
+                self.__buckets[name.strip()] = int(count)
+        self.__workers = int(getenv("HBNB_FILE_SHARD_WORKERS", 8))
+        self.__stale_shards = set()
+        self.__format = serializers.formats[getenv("HBNB_FILE_FORMAT",
+                                                   "json")]
+        self.__lazy = (getenv("HBNB_FILE_LAZY") == "1" and
+                       not self.__sharded and self.__format.name == "json")
+        self.__index_path = self.__file_path + ".index"
+        self.__lock_path = self.__file_path + ".lock"
+        self.__lock_file = None
+        self.__lock_depth = 0
+        self.__seen = {}
+        self.__journal_offset = 0
+        self.__pending = False
+        self.__bulk = 0
+        self.__bulk_seconds = 0.0
+        self.__flusher = None
+        self.__wakeup = threading.Condition(self.__lock)
+        if self.__write_behind:
+            atexit.register(self.flush)
 
-        # If a specific class is provided, filter objects by that class
+    def all(self, cls=None):
+        """Returns a dictionary of objects filtered by class.
+        The dictionary is a snapshot: later changes to the storage are
+        made to a copy of it, so it can be iterated while other threads
+        add or delete instances, and must not be changed itself.
+        That copy is made by the first change after each call, and
+        costs O(n) in the size of the dictionary handed out: all(cls)
+        only copies that class, all() copies every instance."""
         if cls:
-            dictionary = self.__objects
-            for key in dictionary:
-                partition = key.replace('.', ' ')
-                partition = shlex.split(partition)
-                if partition[0] == cls.__name__:
-                    dic[key] = self.__objects[key]
-            return dic
+            if type(cls) is not str:
+                cls = cls.__name__
+            if cls in self.__unloaded:
+                self.__materialize(cls)
+            with self.__lock:
+                self.__shared.add(cls)
+                return self.__classes.setdefault(cls, {})
         else:
             # If no specific class is provided, return all objects
-            return self.__objects
+            for name in list(self.__unloaded):
+                self.__materialize(name)
+            with self.__lock:
+                self.__shared.add(None)
+                return self.__objects
+
+    def get(self, cls, id, load=None):
+        """Returns the object of cls with this id, or None. In lazy
+        mode only its own record is decoded. load is accepted for
+        DBStorage compatibility: children() already answers from an
+        index."""
+        if type(cls) is not str:
+            cls = cls.__name__
+        key = "{}.{}".format(cls, id)
+        obj = self.__classes.get(cls, {}).get(key)
+        if obj is None and key in self.__unloaded.get(cls, {}):
+            with self.__lock:
+                records = self.__unloaded.get(cls, {})
+                if key in records:
+                    offset, length = records[key]
+                    self.__load(key, json.loads(
+                        self.__mapped[offset:offset + length]))
+                obj = self.__objects.get(key)
+        return obj
+
+    def count(self, cls=None):
+        """Returns the number of objects of cls, or of every class,
+        loaded or not, without building any. Counted under the lock,
+        as materializing a class changes both dictionaries."""
+        if type(cls) is not str and cls is not None:
+            cls = cls.__name__
+        with self.__lock:
+            if cls is None:
+                return len(self.__objects) + sum(
+                    len(records) for records in self.__unloaded.values())
+            return len(self.__classes.get(cls, {})) + \
+                len(self.__unloaded.get(cls, {}))
+
+    def iter(self, cls=None, batch_size=1000):
+        """Yields the objects of cls, or of every class. Records lazy
+        mode did not load are decoded batch_size at a time from the
+        mapped file and yielded without being kept, so that going
+        through them all only holds one batch in memory.
+        Without cls the loaded objects come first, in the order all()
+        lists them."""
+        if cls is None:
+            with self.__lock:
+                loaded = list(self.__objects.values())
+                unloaded = {name: list(records) for name, records
+                            in self.__unloaded.items()}
+            yield from loaded
+            for name, keys in unloaded.items():
+                yield from self.__iter_unloaded(name, keys, batch_size)
+            return
+
+        name = cls if type(cls) is str else cls.__name__
+        with self.__lock:
+            # Changes made while iterating go to a copy of the bucket
+            self.__shared.add(name)
+            bucket = self.__classes.get(name, {})
+            keys = list(self.__unloaded.get(name, {}))
+        yield from bucket.values()
+        yield from self.__iter_unloaded(name, keys, batch_size)
+
+    def __iter_unloaded(self, name, keys, batch_size):
+        """Yields the objects of the keys of class name, decoding those
+        still unloaded batch_size at a time"""
+        for start in range(0, len(keys), batch_size):
+            with self.__lock:
+                batch = []
+                records = self.__unloaded.get(name, {})
+                for key in keys[start:start + batch_size]:
+                    if key in records:
+                        offset, length = records[key]
+                        batch.append(self.__decode(json.loads(
+                            self.__mapped[offset:offset + length])))
+                    elif key in self.__objects:
+                        # Loaded since the iteration started
+                        batch.append(self.__objects[key])
+            yield from batch
+
+    def query(self, cls, where=None, order_by=None, limit=None, offset=0,
+              load=None):
+        """Returns the list of objects of cls whose attributes equal the
+        values of the where dictionary, sorted on the order_by attribute
+        ("-name" sorts in descending order), skipping the first offset
+        ones and keeping at most limit of them. load is ignored as in
+        get()."""
+        if type(cls) is not str:
+            cls = cls.__name__
+        where = dict(where or {})
+        # An id or an indexed foreign key narrows down the candidates
+        if "id" in where:
+            obj = self.get(cls, where.pop("id"))
+            objs = [obj] if obj is not None else []
+        else:
+            objs = None
+            for foreign_key in foreign_keys.get(cls, ()):
+                if foreign_key in where:
+                    objs = self.children(cls, foreign_key,
+                                         where.pop(foreign_key))
+                    break
+            if objs is None:
+                objs = self.all(cls).values()
+        if where:
+            objs = [obj for obj in objs
+                    if all(getattr(obj, attribute, None) == value
+                           for attribute, value in where.items())]
+
+        if order_by:
+            attribute = order_by.lstrip('-')
+            reverse = order_by.startswith('-')
+
+            def key(obj):
+                """Sorts missing values first, as SQL does with NULL"""
+                value = getattr(obj, attribute, None)
+                return (value is not None, value)
+
+            if limit is not None:
+                # Only the first offset + limit objects are kept sorted
+                pick = heapq.nlargest if reverse else heapq.nsmallest
+                objs = pick(offset + limit, objs, key=key)
+            else:
+                objs = sorted(objs, key=key, reverse=reverse)
+        else:
+            objs = list(objs)
+        return objs[offset:None if limit is None else offset + limit]
+
+    def children(self, cls, foreign_key, id):
+        """Returns the list of objects of cls whose foreign_key is id"""
+        if type(cls) is not str:
+            cls = cls.__name__
+        if cls in self.__unloaded:
+            self.__materialize(cls)
+        return list(self.__children.get((cls, foreign_key), {})
+                    .get(id, {}).values())
 
     def new(self, obj):
         """Adds a new instance to the dictionary"""
         if obj:
-            key = "{}.{}".format(type(obj).__name__, obj.id)
-            self.__objects[key] = obj
+            with self.__lock:
+                self.__add(obj)
+
+    def bulk_new(self, objs):
+        """Adds the instances to the dictionary under a single lock,
+        for the next bulk_save()"""
+        with self.__lock:
+            start = time.perf_counter()
+            for obj in objs:
+                self.__add(obj)
+                self.__bulk += 1
+            self.__bulk_seconds += time.perf_counter() - start
+
+    def bulk_save(self):
+        """Saves the instances added by bulk_new() in a single write,
+        waiting for it in write-behind mode, and returns the objects
+        written, the seconds spent adding them in bulk_new() and writing
+        them here, and the objects per second.
+        Waiting for a write of another thread is not counted, waiting
+        for the lock file held by another process is."""
+        with self.__write_lock:
+            start = time.perf_counter()
+            self.save()
+            self.flush()
+            seconds = time.perf_counter() - start
+        with self.__lock:
+            rows, self.__bulk = self.__bulk, 0
+            seconds += self.__bulk_seconds
+            self.__bulk_seconds = 0.0
+        return {"rows": rows, "seconds": seconds,
+                "rows_per_second": rows / seconds if seconds else 0.0}
 
     def save(self):
-        """Serializes instances to the JSON file"""
-        my_dict = {}
+        """Serializes instances to the JSON file, or only the changes
+        since the last save to the journal in journal mode.
+        In write-behind mode the write is left to the flusher thread,
+        so that every save made meanwhile shares it."""
+        if not self.__write_behind:
+            self.__commit()
+            return
+
+        with self.__lock:
+            if self.__flusher is None:
+                self.__flusher = threading.Thread(
+                    target=self.__flush_behind, daemon=True)
+                self.__flusher.start()
+            if not self.__pending or self.__overflowing():
+                self.__wakeup.notify()
+            self.__pending = True
 
-        # Convert instances to dictionary format
-        for key, value in self.__objects.items():
-            my_dict[key] = value.to_dict()
+    def flush(self):
+        """Writes the saves still pending in write-behind mode and
+        returns once they, and any write in progress, are on disk.
+        A failed write stays pending, to be retried."""
+        with self.__write_lock:
+            with self.__lock:
+                pending, self.__pending = self.__pending, False
+            if pending:
+                try:
+                    self.__commit()
+                except BaseException:
+                    with self.__lock:
+                        self.__pending = True
+                    raise
 
-        # Save the dictionary to the JSON file
-        with open(self.__file_path, 'w', encoding="UTF-8") as f:
-            json.dump(my_dict, f)
+    def compact(self):
+        """Writes every instance to the JSON file, or only the shards
+        that changed in sharded mode, and empties the journal.
+        The instances are only listed under the lock, their dictionaries
+        are built and written without holding it."""
+        with self.__write_lock, self.__file_lock(fcntl.LOCK_EX):
+            self.__merge()
+            with self.__lock:
+                if self.__format.name != "json":
+                    # Only JSON records can be copied without being read
+                    for name in list(self.__unloaded):
+                        self.__materialize(name)
+                dirty = set(self.__dirty)
+                self.__dirty.clear()
+                if self.__sharded:
+                    shards = self.__list_shards()
+                else:
+                    items = list(self.__objects.items())
+                    unloaded = {name: dict(records) for name, records
+                                in self.__unloaded.items()}
+            try:
+                if self.__sharded:
+                    self.__write_shards(shards)
+                    self.__remove_journal()
+                    return
+
+                # Save the records next to the JSON file, then swap it in
+                # so that readers only ever see a complete file
+                index = self.__replace(
+                    self.__file_path,
+                    lambda f: self.__write_records(f, items, unloaded))
+            except BaseException:
+                with self.__lock:
+                    self.__dirty |= dirty
+                    if self.__sharded:
+                        self.__dirty_shards.update(shards)
+                raise
+            if index is not None:
+                with self.__lock:
+                    # Records still unloaded now live in the new file
+                    for name, records in self.__unloaded.items():
+                        self.__unloaded[name] = {key: index[name][key]
+                                                 for key in records}
+                    if self.__unloaded or self.__lazy:
+                        self.__map()
+                if self.__lazy:
+                    self.__write_index(index)
+            self.__remove_journal()
 
     def reload(self):
-        """Deserializes JSON file to instances"""
+        """Deserializes JSON file to instances, then replays the journal.
+        Instances changed since the last save are kept as they are."""
+        # Pending saves must reach the file before it is read back
+        self.flush()
+        with self.__write_lock, self.__file_lock(fcntl.LOCK_SH):
+            self.__read()
+
+    def __read(self):
+        """Reads the snapshot and replays the journal over it into new
+        dictionaries without holding the lock, readers carrying on with
+        the current ones meanwhile, then swaps them in. Instances
+        changed here since the last save are carried over as they are;
+        the saved ones the files no longer hold are gone."""
+        shards = set()
+        records, unloaded, mapped = self.__read_snapshot(shards)
+        journal, offset = self.__read_journal(0)
+        for record in journal:
+            key = record[1]
+            unloaded.get(key.partition('.')[0], {}).pop(key, None)
+            if record[0] == "u":
+                records[key] = record[2]
+            else:
+                records.pop(key, None)
+            if self.__sharded:
+                shards.add(self.__shard(*key.split('.', 1)))
+
+        objects, classes, children, parents = {}, {}, {}, {}
+        for key, value in records.items():
+            obj = objects[key] = self.__decode(value)
+            classes.setdefault(key.partition('.')[0], {})[key] = obj
+            self.__index(children, parents, key, obj)
+
+        with self.__lock:
+            for key in self.__dirty:
+                name = key.partition('.')[0]
+                unloaded.get(name, {}).pop(key, None)
+                obj = self.__objects.get(key)
+                if obj is None:
+                    objects.pop(key, None)
+                    classes.get(name, {}).pop(key, None)
+                    self.__unindex(children, parents, key)
+                else:
+                    objects[key] = obj
+                    classes.setdefault(name, {})[key] = obj
+                    self.__index(children, parents, key, obj)
+            FileStorage.__objects = objects
+            FileStorage.__classes = classes
+            FileStorage.__children = children
+            FileStorage.__parents = parents
+            FileStorage.__unloaded = unloaded
+            FileStorage.__shared = set()
+            self.__dirty_shards.update(shards)
+            self.__swap_map(mapped)
+        self.__journal_offset = offset
+
+    def __read_snapshot(self, shards):
+        """Returns the {key: record} of the snapshot files, the per-class
+        {key: [offset, length]} of the records lazy mode leaves in the
+        file and the map of it they point into; adds the shards to write
+        on the next save to shards"""
+        records, unloaded, mapped = {}, {}, None
         try:
-            # Load instances from the JSON file to the dictionary
-            with open(self.__file_path, 'r', encoding="UTF-8") as f:
-                for key, value in (json.load(f)).items():
-                    value = eval(value["__class__"])(**value)
-                    self.__objects[key] = value
+            if self.__shards_newer():
+                records = self.__read_shards(shards)
+                if not self.__sharded:
+                    # Written before sharding was turned off: the next
+                    # save moves them back to the single file
+                    self.__seen[self.__file_path] = \
+                        self.__stat(self.__file_path)
+                return records, unloaded, mapped
+
+            if self.__sharded and os.path.isdir(self.__shard_path):
+                # Older than the single file written since sharding was
+                # turned off, rewritten from it on the next save
+                self.__claim_shards(shards)
+            index = self.__read_index() if self.__lazy else None
+            if index is not None:
+                # Only the offsets are read, records wait in the map
+                self.__seen[self.__file_path] = self.__stat(self.__file_path)
+                mapped = self.__open_map()
+                unloaded = {name: offsets for name, offsets in index.items()
+                            if offsets}
+                return records, unloaded, mapped
+
+            with open(self.__file_path, 'rb') as f:
+                self.__seen[self.__file_path] = self.__stat(f.fileno())
+                records = serializers.load(f.read())
+            if self.__sharded:
+                # Moves the single file over to the shards
+                shards.update(self.__shard(*key.split('.', 1))
+                              for key in records)
         except FileNotFoundError:
             pass
+        return records, unloaded, mapped
+
+    def __shards_newer(self):
+        """Tells if the snapshot to read is the shard directory: the
+        layout written last when both the shards and the single file
+        exist, so that turning HBNB_FILE_SHARDED on or off keeps what
+        was saved before"""
+        if not os.path.isdir(self.__shard_path):
+            return False
+        single = self.__stat(self.__file_path)
+        if single is None:
+            return True
+        shards = os.stat(self.__shard_path).st_mtime_ns
+        if shards == single[1]:
+            return self.__sharded
+        return shards > single[1]
+
+    def __claim_shards(self, shards):
+        """Adds every shard found in the directory to shards, to be
+        rewritten or removed once it holds nothing, and remembers them
+        as seen"""
+        extensions = [fmt.extension for fmt in serializers.formats.values()]
+        for entry in os.listdir(self.__shard_path):
+            shard, extension = os.path.splitext(entry)
+            if extension not in extensions:
+                continue
+            path = os.path.join(self.__shard_path, entry)
+            self.__seen[path] = self.__stat(path)
+            if extension == self.__format.extension and \
+                    shard in self.__shards_of(shard.partition('.')[0]):
+                shards.add(shard)
+            else:
+                self.__stale_shards.add(entry)
+
+    def __replay(self, offset):
+        """Replays the journal records from offset on"""
+        journal, offset = self.__read_journal(offset)
+        with self.__lock:
+            for record in journal:
+                if record[0] == "u":
+                    self.__load(record[1], record[2])
+                else:
+                    self.__drop(record[1])
+                if self.__sharded:
+                    self.__dirty_shards.add(self.__shard(
+                        *record[1].split('.', 1)))
+        self.__journal_offset = offset
+
+    def __read_journal(self, offset):
+        """Returns the journal records from offset on, and the offset
+        following the last complete one"""
+        journal = []
+        try:
+            with open(self.__journal_path, 'rb') as f:
+                self.__seen[self.__journal_path] = self.__stat(f.fileno())
+                f.seek(offset)
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError
+                        journal.append(json.loads(line))
+                    except ValueError:
+                        # A torn last record from an interrupted save
+                        break
+                    offset += len(line)
+        except FileNotFoundError:
+            offset = 0
+        return journal, offset
 
     def delete(self, obj=None):
         """Delete an existing instance from the dictionary"""
         if obj:
-            key = "{}.{}".format(type(obj).__name__, obj.id)
-            del self.__objects[key]
+            name = type(obj).__name__
+            key = "{}.{}".format(name, obj.id)
+            with self.__lock:
+                objects, bucket = self.__writable(name)
+                # iter() yields records of lazy mode it did not load
+                unloaded = self.__unloaded.get(name, {}).pop(key, None)
+                if objects.pop(key, None) is None and unloaded is None:
+                    raise KeyError(key)
+                bucket.pop(key, None)
+                self.__unindex(self.__children, self.__parents, key)
+                self.__dirty.add(key)
+                if self.__sharded:
+                    self.__dirty_shards.add(self.__shard(name, obj.id))
 
     def close(self):
-        """Calls reload() to load instances from the JSON file"""
-        self.reload()
+        """Brings the instances up to date with the files, which is
+        nothing when no file changed since this storage last read or
+        wrote it. Otherwise only changed shards and the journal records
+        appended since are read, falling back to reload().
+        Saves pending in write-behind mode are left to the flusher
+        thread: the instances they changed are kept as they are."""
+        with self.__write_lock, self.__file_lock(fcntl.LOCK_SH):
+            self.__merge()
+
+    def __merge(self):
+        """Applies what other processes wrote since the files were last
+        seen, keeping the instances changed here since the last save"""
+        if not self.__refresh():
+            self.__read()
+
+    def __refresh(self):
+        """Applies what changed in the files since they were last seen,
+        returns False when that takes reading everything again"""
+        if self.__sharded and os.path.isdir(self.__shard_path):
+            changed = self.__refresh_shards()
+            if changed is None:
+                return False
+            if changed:
+                # The journal holds what came after the shards, and may
+                # be a new one since a compaction wrote them
+                self.__replay(0)
+                return True
+        elif self.__stat(self.__file_path) != \
+                self.__seen.get(self.__file_path):
+            return False
+
+        seen = self.__seen.get(self.__journal_path)
+        stat = self.__stat(self.__journal_path)
+        if stat == seen:
+            return True
+        if seen is None or stat is None or stat[2] != seen[2] or \
+                stat[0] < self.__journal_offset:
+            # The journal was folded back or replaced meanwhile
+            return False
+        self.__replay(self.__journal_offset)
+        return True
+
+    def __refresh_shards(self):
+        """Reloads the shards whose file changed and tells if there were
+        any, returns None when the directory holds shards of another
+        layout or format. The files are read without the lock."""
+        seen = {path: stat for path, stat in self.__seen.items()
+                if os.path.dirname(path) == self.__shard_path}
+        loaded = []
+        extensions = [fmt.extension for fmt in serializers.formats.values()]
+        for entry in os.listdir(self.__shard_path):
+            shard, extension = os.path.splitext(entry)
+            if extension not in extensions:
+                continue
+            path = os.path.join(self.__shard_path, entry)
+            if seen.pop(path, None) == self.__stat(path):
+                continue
+            if extension != self.__format.extension or \
+                    shard not in self.__shards_of(shard.partition('.')[0]):
+                return None
+            try:
+                with open(path, 'rb') as f:
+                    self.__seen[path] = self.__stat(f.fileno())
+                    loaded.append((shard, serializers.load(f.read())))
+            except FileNotFoundError:
+                loaded.append((shard, {}))
+        # Shards removed since, their class emptied elsewhere
+        loaded.extend((os.path.splitext(os.path.basename(path))[0], {})
+                      for path in seen)
+        for path in seen:
+            del self.__seen[path]
+        with self.__lock:
+            for shard, records in loaded:
+                self.__forget_shard(shard)
+                for key, value in records.items():
+                    self.__load(key, value)
+        return bool(loaded)
+
+    def __forget_shard(self, shard):
+        """Drops the saved instances of a shard before it is read again;
+        instances changed since the last save are kept"""
+        name = shard.partition('.')[0]
+        for key, obj in list(self.__classes.get(name, {}).items()):
+            if key not in self.__dirty and \
+                    self.__shard(name, obj.id) == shard:
+                self.__drop(key)
+
+    @staticmethod
+    def __stat(path):
+        """Size, modification time and inode of a file or descriptor, or
+        None when it does not exist"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def __commit(self):
+        """Performs the physical write of a save"""
+        if not self.__journal:
+            self.compact()
+            return
+
+        with self.__write_lock, self.__file_lock(fcntl.LOCK_EX):
+            with self.__lock:
+                dirty = set(self.__dirty)
+                self.__dirty.clear()
+                changes = [(key, self.__objects.get(key)) for key in dirty]
+
+            # Append one upsert or delete record per changed key
+            before = self.__stat(self.__journal_path)
+            try:
+                with open(self.__journal_path, 'a', encoding="UTF-8") as f:
+                    for key, obj in changes:
+                        if obj is not None:
+                            record = ["u", key, obj.to_dict()]
+                        else:
+                            record = ["d", key]
+                        f.write(json.dumps(record, separators=(',', ':')) +
+                                "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                    size = f.tell()
+                    if before == self.__seen.get(self.__journal_path):
+                        # Nothing was appended by others since last seen
+                        self.__seen[self.__journal_path] = \
+                            self.__stat(f.fileno())
+                        self.__journal_offset = size
+            except BaseException:
+                with self.__lock:
+                    self.__dirty |= dirty
+                raise
+
+            # Fold the journal back once it outgrows the snapshot itself
+            try:
+                snapshot = os.path.getsize(self.__file_path)
+            except OSError:
+                snapshot = 0
+            if size > max(self.__journal_max, snapshot):
+                self.compact()
+
+    def __overflowing(self):
+        """Tells if enough keys changed to write before the interval"""
+        return 0 < self.__max_dirty <= len(self.__dirty)
+
+    def __flush_behind(self):
+        """Body of the flusher thread: once a save is pending, gathers
+        saves for an interval, or until enough keys changed, then
+        writes them all. A failed write is logged and retried an
+        interval later, the thread carries on."""
+        while True:
+            with self.__lock:
+                self.__wakeup.wait_for(lambda: self.__pending)
+                self.__wakeup.wait_for(self.__overflowing, self.__interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("write-behind flush of %s failed",
+                                 self.__file_path)
+                time.sleep(self.__interval)
+
+    @contextmanager
+    def __file_lock(self, operation):
+        """Holds the lock file with operation, fcntl.LOCK_SH or LOCK_EX,
+        against other processes. Taken under __write_lock; nested uses
+        share the outermost one."""
+        if self.__lock_depth == 0:
+            self.__lock_file = self.__open_lock(operation)
+        self.__lock_depth += 1
+        try:
+            yield
+        finally:
+            self.__lock_depth -= 1
+            if self.__lock_depth == 0 and self.__lock_file is not None:
+                # Closing the file releases the lock
+                self.__lock_file.close()
+                self.__lock_file = None
+
+    def __open_lock(self, operation):
+        """Opens the lock file and takes it with operation. Only writers
+        create it: readers that find none, or cannot open it as in a
+        read-only data directory, get None and read without it, as
+        snapshots are replaced whole and torn journal records skipped"""
+        if operation == fcntl.LOCK_EX:
+            lock_file = open(self.__lock_path, 'a')
+        else:
+            try:
+                lock_file = open(self.__lock_path, 'r')
+            except (FileNotFoundError, PermissionError):
+                return None
+        try:
+            fcntl.flock(lock_file.fileno(), operation)
+        except BaseException:
+            lock_file.close()
+            raise
+        return lock_file
+
+    def __remove_journal(self):
+        """Drops the journal once the snapshot holds what it recorded"""
+        try:
+            os.remove(self.__journal_path)
+        except FileNotFoundError:
+            pass
+        self.__seen[self.__journal_path] = None
+        self.__journal_offset = 0
+
+    def __shard(self, name, id):
+        """Returns the shard holding the instance name.id: the class
+        name, followed by the hash bucket for classes split in buckets"""
+        count = self.__buckets.get(name, 1)
+        if count <= 1:
+            return name
+        return "{}.{}-of-{}".format(
+            name, zlib.crc32(id.encode()) % count, count)
+
+    def __shards_of(self, name):
+        """Returns every shard of the class name in the current layout"""
+        count = self.__buckets.get(name, 1)
+        if count <= 1:
+            return [name]
+        return ["{}.{}-of-{}".format(name, i, count) for i in range(count)]
+
+    def __list_shards(self):
+        """Returns the (key, obj) pairs of every dirty shard and marks
+        them clean; called under the lock"""
+        shards = {}
+        for shard in self.__dirty_shards:
+            name = shard.partition('.')[0]
+            shards[shard] = [(key, obj) for key, obj in
+                             self.__classes.get(name, {}).items()
+                             if self.__shard(name, obj.id) == shard]
+        self.__dirty_shards.clear()
+        return shards
+
+    def __write_shards(self, shards):
+        """Rewrites the listed shards, then removes the stale ones"""
+        os.makedirs(self.__shard_path, exist_ok=True)
+        for shard, items in shards.items():
+            path = os.path.join(self.__shard_path,
+                                shard + self.__format.extension)
+            if items:
+                self.__replace(path, lambda f: self.__write_records(
+                    f, items, {}))
+            else:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                self.__seen.pop(path, None)
+        for entry in list(self.__stale_shards):
+            path = os.path.join(self.__shard_path, entry)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.__seen.pop(path, None)
+        self.__stale_shards.clear()
+
+    def __read_shards(self, shards):
+        """Returns the records of every shard, reading and parsing them
+        in parallel. Shards left from another bucket layout or format
+        are read first, so the current ones win, and are replaced on the
+        next save: the shards of their class are added to shards."""
+        extensions = [fmt.extension for fmt in serializers.formats.values()]
+        current, stale = [], []
+        for entry in sorted(os.listdir(self.__shard_path)):
+            shard, extension = os.path.splitext(entry)
+            if extension not in extensions:
+                continue
+            name = shard.partition('.')[0]
+            if extension == self.__format.extension and \
+                    shard in self.__shards_of(name):
+                current.append(entry)
+            else:
+                stale.append(entry)
+                self.__stale_shards.add(entry)
+                shards.update(self.__shards_of(name))
+        entries = stale + current
+        records = {}
+        if not entries:
+            return records
+
+        def read(entry):
+            """Parses one shard file"""
+            path = os.path.join(self.__shard_path, entry)
+            with open(path, 'rb') as f:
+                self.__seen[path] = self.__stat(f.fileno())
+                return serializers.load(f.read())
+
+        workers = max(1, min(self.__workers, len(entries)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for shard_records in pool.map(read, entries):
+                records.update(shard_records)
+        return records
+
+    def __replace(self, path, write):
+        """Atomically replaces path with what write(f) puts in f, and
+        returns whatever write returned"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(
+            dir=directory, prefix=os.path.basename(path))
+        try:
+            with open(fd, 'wb') as f:
+                try:
+                    mode = os.stat(path).st_mode & 0o7777
+                except FileNotFoundError:
+                    mode = 0o644
+                os.chmod(tmp_path, mode)
+                result = write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.__fsync_directory(directory)
+        self.__seen[path] = self.__stat(path)
+        return result
+
+    @staticmethod
+    def __fsync_directory(directory):
+        """Makes a rename inside directory durable, where supported"""
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def __write_records(self, f, items, unloaded):
+        """Writes the (key, obj) items and the per-class unloaded
+        {key: [offset, length]} records to f in the storage format, and
+        returns what the format returns: the per-class offsets of the
+        values for JSON. Unloaded records are copied as they were
+        mapped."""
+        def records():
+            """Yields (key, record) for every record to write"""
+            for key, value in items:
+                yield key, value.to_dict()
+            for mapped in unloaded.values():
+                for key, (start, length) in mapped.items():
+                    yield key, self.__mapped[start:start + length]
+
+        return self.__format.dump(records(), f)
+
+    def __write_index(self, index):
+        """Saves index next to the JSON file, stamped with the size and
+        modification time of the file it is valid for"""
+        stat = os.stat(self.__file_path)
+        header = {"size": stat.st_size, "mtime": stat.st_mtime_ns,
+                  "records": index}
+        self.__replace(self.__index_path,
+                       lambda f: f.write(json.dumps(header).encode()))
+
+    def __read_index(self):
+        """Returns the offset index if it matches the JSON file"""
+        try:
+            with open(self.__index_path, 'r', encoding="UTF-8") as f:
+                header = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        stat = os.stat(self.__file_path)
+        if (header.get("size"), header.get("mtime")) != \
+                (stat.st_size, stat.st_mtime_ns):
+            return None
+        return header["records"]
+
+    def __map(self):
+        """Maps the JSON file the unloaded offsets point into; called
+        under the lock"""
+        self.__swap_map(self.__open_map())
+
+    def __open_map(self):
+        """Returns a read-only map of the JSON file"""
+        with open(self.__file_path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __swap_map(self, mapped):
+        """Replaces the map unloaded offsets point into by mapped, or by
+        none, closing the previous one; called under the lock"""
+        if self.__mapped is not None:
+            self.__mapped.close()
+        FileStorage.__mapped = mapped
+
+    def __materialize(self, name):
+        """Builds every unloaded instance of the class called name"""
+        with self.__lock:
+            records = self.__unloaded.pop(name, None)
+            for key, (offset, length) in (records or {}).items():
+                self.__load(key, json.loads(
+                    self.__mapped[offset:offset + length]))
+
+    def __load(self, key, value):
+        """Builds the instance stored under key from its dictionary,
+        unless it changed here since the last save"""
+        if key in self.__dirty:
+            return
+        name = key.partition('.')[0]
+        value = self.__decode(value)
+        objects, bucket = self.__writable(name)
+        objects[key] = value
+        bucket[key] = value
+        self.__unloaded.get(name, {}).pop(key, None)
+        self.__index(self.__children, self.__parents, key, value)
+
+    def __decode(self, value):
+        """Builds an instance from its dictionary without going through
+        __init__: the class comes from the registry, the timestamps are
+        parsed by datetime.fromisoformat and the attributes are set in
+        a single update of the instance dictionary"""
+        name = value.pop("__class__")
+        if not ("id" in value and "created_at" in value and
+                "updated_at" in value):
+            return classes[name](**value)
+        try:
+            obj = self.__constructors[name]()
+        except KeyError:
+            obj = self.__constructor(name)()
+        for attr in ("created_at", "updated_at"):
+            if type(value[attr]) is str:
+                value[attr] = datetime.fromisoformat(value[attr])
+        obj.__dict__.update(value)
+        return obj
+
+    def __constructor(self, name):
+        """Registers how blank instances of the class name are made.
+        Mapped classes need their SQLAlchemy instance state."""
+        cls = classes[name]
+        manager = manager_of_class(cls)
+        if manager is None:
+            construct = partial(cls.__new__, cls)
+        else:
+            configure_mappers()
+            construct = manager.new_instance
+        self.__constructors[name] = construct
+        return construct
+
+    def __drop(self, key):
+        """Drops key from the dictionary, loaded or not, unless it
+        changed here since the last save"""
+        if key in self.__dirty:
+            return
+        name = key.partition('.')[0]
+        if key in self.__objects:
+            objects, bucket = self.__writable(name)
+            del objects[key]
+            bucket.pop(key, None)
+            self.__unindex(self.__children, self.__parents, key)
+        self.__unloaded.get(name, {}).pop(key, None)
+
+    def __add(self, obj):
+        """Adds obj to the dictionaries and indexes, under the lock"""
+        name = type(obj).__name__
+        key = "{}.{}".format(name, obj.id)
+        objects, bucket = self.__writable(name)
+        objects[key] = obj
+        bucket[key] = obj
+        self.__unloaded.get(name, {}).pop(key, None)
+        self.__index(self.__children, self.__parents, key, obj)
+        self.__dirty.add(key)
+        if self.__sharded:
+            self.__dirty_shards.add(self.__shard(name, obj.id))
+
+    def __writable(self, name):
+        """Returns __objects and the bucket of the class called name,
+        after copying those a reader holds; called under the lock"""
+        if None in self.__shared:
+            FileStorage.__objects = dict(self.__objects)
+            self.__shared.discard(None)
+        if name in self.__shared:
+            self.__classes[name] = dict(self.__classes.get(name, {}))
+            self.__shared.discard(name)
+        return self.__objects, self.__classes.setdefault(name, {})
+
+    @staticmethod
+    def __index(children, parents, key, obj):
+        """Files obj under the parents its foreign keys point to, in the
+        children and parents indexes"""
+        name = key.partition('.')[0]
+        for foreign_key in foreign_keys.get(name, ()):
+            FileStorage.__link(children, parents, key, obj, foreign_key,
+                               getattr(obj, foreign_key, None))
+
+    @staticmethod
+    def __unindex(children, parents, key):
+        """Removes key from the children of its parents"""
+        name = key.partition('.')[0]
+        for foreign_key, parent in parents.pop(key, {}).items():
+            FileStorage.__unlink(children, key, (name, foreign_key), parent)
+
+    @staticmethod
+    def __link(children, parents, key, obj, foreign_key, parent):
+        """Moves key under the parent its foreign_key now holds"""
+        index = (key.partition('.')[0], foreign_key)
+        linked = parents.setdefault(key, {})
+        FileStorage.__unlink(children, key, index,
+                             linked.pop(foreign_key, None))
+        if parent is not None:
+            children.setdefault(index, {}).setdefault(
+                parent, {})[key] = obj
+            linked[foreign_key] = parent
+
+    @staticmethod
+    def __unlink(children, key, index, parent):
+        """Removes key from the children of parent"""
+        siblings = children.get(index, {}).get(parent)
+        if siblings is not None:
+            siblings.pop(key, None)
+            if not siblings:
+                del children[index][parent]
+
+    @classmethod
+    def _moved(cls, target, value, oldvalue, initiator):
+        """Listener of the foreign key attributes: refiles a stored
+        instance when one of them is assigned"""
+        key = "{}.{}".format(type(target).__name__,
+                             target.__dict__.get("id"))
+        with cls.__lock:
+            if cls.__objects.get(key) is target:
+                cls.__link(cls.__children, cls.__parents, key, target,
+                           initiator.key, value)
+
+
+for name, attributes in foreign_keys.items():
+    for attribute in attributes:
+        event.listen(getattr(classes[name], attribute), "set",
+                     FileStorage._moved)
@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+"""Versioned schema migrations of the database storage
+
+create_all() only creates the tables missing, with the indexes the
+models declare; it never changes a table that already exists. Each
+step of MIGRATIONS brings such tables up to date, and upgrade() runs
+the steps a database has not recorded in its schema_migrations table
+yet. Steps name what they change rather than reading it from the
+models, so that they do the same on every database however the models
+evolve after them, and leave alone what is already there, as on a
+database create_all() just made.
+
+Workers starting together may run the same steps at once: what one of
+them finds already created or recorded by another counts as done.
+"""
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, \
+    String, Table, func, inspect, select
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+metadata = MetaData()
+schema_migrations = Table("schema_migrations", metadata,
+                          Column("version", Integer, primary_key=True),
+                          Column("description", String(128),
+                                 nullable=False),
+                          Column("applied_at", DateTime, nullable=False))
+
+
+def exists(connection, element):
+    """Tells whether the table or index element is in the database"""
+    inspector = inspect(connection)
+    if isinstance(element, Table):
+        return inspector.has_table(element.name)
+    return element.name in [index["name"] for index in
+                            inspector.get_indexes(element.table.name)]
+
+
+def create(connection, element):
+    """Creates the table or index element if it is missing, and if
+    another worker creates it first"""
+    try:
+        element.create(connection, checkfirst=True)
+    except DBAPIError:
+        if not exists(connection, element):
+            raise
+
+
+def create_indexes(*indexes):
+    """Returns a step creating the indexes missing, each given as its
+    name, its table name and the names of its columns"""
+    def step(connection):
+        """Creates the indexes missing"""
+        for name, table, *columns in indexes:
+            table = Table(table, MetaData(),
+                          *[Column(column) for column in columns])
+            create(connection, Index(name, *table.columns))
+    return step
+
+
+MIGRATIONS = [
+    (1, "index foreign key, name and price columns",
+     create_indexes(("ix_cities_state_id", "cities", "state_id"),
+                    ("ix_places_user_id", "places", "user_id"),
+                    ("ix_places_city_id_price_by_night", "places",
+                     "city_id", "price_by_night"),
+                    ("ix_place_amenity_amenity_id", "place_amenity",
+                     "amenity_id"),
+                    ("ix_reviews_place_id", "reviews", "place_id"),
+                    ("ix_reviews_user_id", "reviews", "user_id"),
+                    ("ix_states_name", "states", "name"),
+                    ("ix_cities_name", "cities", "name"),
+                    ("ix_amenities_name", "amenities", "name"))),
+]
+
+
+def version(connection):
+    """Returns the latest version applied to the database, 0 if none"""
+    create(connection, schema_migrations)
+    return connection.execute(
+        select(func.max(schema_migrations.c.version))).scalar() or 0
+
+
+def upgrade(connection):
+    """Runs the steps of MIGRATIONS above the version of the database,
+    in order, recording each of them; returns the versions recorded,
+    leaving out those another worker recorded first"""
+    current = version(connection)
+    applied = []
+    for number, description, step in MIGRATIONS:
+        if number > current:
+            step(connection)
+            try:
+                connection.execute(schema_migrations.insert().values(
+                    version=number, description=description,
+                    applied_at=datetime.utcnow()))
+            except IntegrityError:
+                continue
+            applied.append(number)
+    return applied
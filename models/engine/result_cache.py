@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+"""Result cache backends of the database storage
+
+A backend maps keys, tuples whose first item is a class name, to query
+results. It answers get(key) with the result, or None once it is
+missing or expired, stores one with set(key, value), forgets every
+result of a class with invalidate(name) and every result with clear().
+len() gives the number of results it holds.
+LRUCache keeps them in process; others can be added to backends.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Holds at most size results, evicting the least recently used
+    one first, each for ttl seconds"""
+
+    def __init__(self, size=1024, ttl=60):
+        """Instantiate an empty cache"""
+        self.size = size
+        self.ttl = ttl
+        self.evictions = 0
+        self.__entries = OrderedDict()
+        self.__names = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        """Number of results held, expired ones included"""
+        return len(self.__entries)
+
+    def get(self, key):
+        """Returns the result stored under key, or None"""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                self.__remove(key)
+                return None
+            self.__entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Stores value under key, evicting the least recently used
+        results beyond size"""
+        with self.__lock:
+            self.__entries[key] = (value, time.monotonic() + self.ttl)
+            self.__entries.move_to_end(key)
+            self.__names.setdefault(key[0], set()).add(key)
+            while len(self.__entries) > self.size:
+                self.__remove(next(iter(self.__entries)))
+                self.evictions += 1
+
+    def invalidate(self, name):
+        """Forgets every result of the class called name"""
+        with self.__lock:
+            for key in self.__names.pop(name, ()):
+                self.__entries.pop(key, None)
+
+    def clear(self):
+        """Forgets every result"""
+        with self.__lock:
+            self.__entries.clear()
+            self.__names.clear()
+
+    def __remove(self, key):
+        """Forgets the result under key, under the lock"""
+        del self.__entries[key]
+        keys = self.__names[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self.__names[key[0]]
+
+
+backends = {"lru": LRUCache}
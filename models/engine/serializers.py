@@ -0,0 +1,252 @@
+#!/usr/bin/python3
+"""Snapshot formats of the file storage
+
+A format turns (key, record) pairs, where a record is the to_dict()
+of an instance, into the bytes of a storage file and back.
+JSONSerializer is the default; BinarySerializer stores each class as
+a block of columns, with the schema written once per class.
+"""
+import json
+import sys
+from datetime import datetime, timedelta
+from itertools import accumulate, chain, compress, repeat
+from struct import pack, unpack_from
+from uuid import UUID
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+TIMESTAMPS = ("created_at", "updated_at")
+# Positions of the hex digits in the text of a UUID, around its dashes
+UUID_DIGITS = [i for i in range(36) if i not in (8, 13, 18, 23)]
+
+
+class JSONSerializer:
+    """One JSON object per file, one record per line, so that every
+    record value sits at a known offset of the file"""
+    name = "json"
+    extension = ".json"
+
+    def dump(self, items, f):
+        """Writes items to f and returns the per-class
+        {key: [offset, length]} of every record value.
+        A record given as bytes is copied as it is."""
+        index = {}
+        offset = f.write(b"{")
+        separator = b"\n"
+        for key, record in items:
+            if type(record) is not bytes:
+                record = json.dumps(record, default=self.__default).encode()
+            offset += f.write(separator + json.dumps(key).encode() + b": ")
+            index.setdefault(key.partition('.')[0], {})[key] = \
+                [offset, len(record)]
+            offset += f.write(record)
+            separator = b",\n"
+        f.write(b"\n}\n")
+        return index
+
+    def load(self, data):
+        """Returns the {key: record} held in data"""
+        return json.loads(data)
+
+    @staticmethod
+    def __default(value):
+        """Timestamps read from a binary file go back to ISO format"""
+        return value.isoformat()
+
+
+class BinarySerializer:
+    """Columnar format: for each class, its name, row count and, for
+    each attribute, its name, type and values stored side by side.
+    Ids are 16 byte UUIDs, timestamps microseconds since the epoch,
+    numbers fixed size little endian values and strings UTF-8 bytes
+    after their lengths. Attributes that not every row has carry a
+    presence byte per row; values of mixed types are stored as JSON."""
+    name = "binary"
+    extension = ".bin"
+    magic = b"HBNB\x00BIN1"
+
+    def dump(self, items, f):
+        """Writes items to f, grouped by class"""
+        groups = {}
+        for key, record in items:
+            if type(record) is bytes:
+                record = json.loads(record)
+            groups.setdefault(record["__class__"], []).append(record)
+
+        out = [self.magic, pack("<I", len(groups))]
+        for name, records in groups.items():
+            columns = {}
+            for record in records:
+                for column in record:
+                    if column != "__class__":
+                        columns[column] = None
+            out.append(self.__text(name))
+            out.append(pack("<II", len(records), len(columns)))
+            for column in columns:
+                present = [column in record for record in records]
+                values = [record[column] for record in records
+                          if column in record]
+                kind, data = self.__encode(column, values)
+                out.append(self.__text(column))
+                if all(present):
+                    out.append(pack("<cB", kind, 0))
+                else:
+                    out.append(pack("<cB", kind, 1))
+                    out.append(bytes(present))
+                out.append(pack("<Q", len(data)))
+                out.append(data)
+        f.write(b"".join(out))
+
+    def load(self, data):
+        """Returns the {key: record} held in data. Every column is
+        decoded as a whole, then the records of a class are built in a
+        single pass over the columns all of them have"""
+        data = memoryview(data)
+        pos = len(self.magic)
+        records = {}
+        (count,) = unpack_from("<I", data, pos)
+        pos += 4
+        for i in range(count):
+            name, pos = self.__read_text(data, pos)
+            rows, columns = unpack_from("<II", data, pos)
+            pos += 8
+            dense = {"__class__": repeat(name, rows)}
+            sparse = []
+            for j in range(columns):
+                column, pos = self.__read_text(data, pos)
+                kind, is_sparse = unpack_from("<cB", data, pos)
+                pos += 2
+                present = None
+                if is_sparse:
+                    present = bytes(data[pos:pos + rows])
+                    pos += rows
+                (size,) = unpack_from("<Q", data, pos)
+                pos += 8
+                values = self.__decode(
+                    kind, data[pos:pos + size],
+                    rows if present is None else present.count(1))
+                pos += size
+                if present is None:
+                    dense[column] = values
+                else:
+                    sparse.append((column, present, values))
+            group = list(map(dict, map(zip, repeat(tuple(dense)),
+                                       zip(*dense.values()))))
+            for column, present, values in sparse:
+                for record, value in zip(compress(group, present), values):
+                    record[column] = value
+            records.update(zip(map((name + ".").__add__, dense["id"]),
+                               group))
+        return records
+
+    @staticmethod
+    def __text(value):
+        """Length prefixed UTF-8"""
+        value = value.encode()
+        return pack("<I", len(value)) + value
+
+    @staticmethod
+    def __read_text(data, pos):
+        """Reads a length prefixed string, returns it and the new pos"""
+        (size,) = unpack_from("<I", data, pos)
+        pos += 4
+        return str(data[pos:pos + size], "UTF-8"), pos + size
+
+    def __encode(self, column, values):
+        """Picks the tightest type holding every value of a column and
+        returns its one byte tag and the encoded values"""
+        n = len(values)
+        types = set(map(type, values))
+        if types == {int} and all(-1 << 63 <= v < 1 << 63 for v in values):
+            return b"i", pack("<%dq" % n, *values)
+        if types == {float}:
+            return b"f", pack("<%dd" % n, *values)
+        if types == {str}:
+            if column in TIMESTAMPS:
+                try:
+                    stamps = [(datetime.fromisoformat(v) - EPOCH)
+                              // MICROSECOND for v in values]
+                    return b"t", pack("<%dq" % n, *stamps)
+                except (ValueError, TypeError):
+                    pass
+            try:
+                ids = [UUID(v) for v in values]
+                if all(str(u) == v for u, v in zip(ids, values)):
+                    return b"u", b"".join(u.bytes for u in ids)
+            except ValueError:
+                pass
+            return b"s", self.__strings(values)
+        return b"j", self.__strings([json.dumps(v) for v in values])
+
+    @staticmethod
+    def __strings(values):
+        """Lengths of the UTF-8 strings, then the strings themselves"""
+        values = [v.encode() for v in values]
+        return pack("<%dI" % len(values), *map(len, values)) + \
+            b"".join(values)
+
+    @staticmethod
+    def __decode(kind, data, n):
+        """Returns the n values of a column"""
+        if kind == b"i":
+            return unpack_from("<%dq" % n, data)
+        if kind == b"f":
+            return unpack_from("<%dd" % n, data)
+        if kind == b"t":
+            return list(map(EPOCH.__add__, map(
+                MICROSECOND.__mul__, unpack_from("<%dq" % n, data))))
+        if kind == b"u":
+            if not n:
+                return []
+            # Every id takes 36 characters and a space: each digit is
+            # copied to its place in all of them with a single slice
+            digits = data.hex().encode()
+            text = bytearray(b"-" * (37 * n))
+            text[36::37] = b" " * n
+            for i, position in enumerate(UUID_DIGITS):
+                text[position::37] = digits[i::32]
+            return text[:-1].decode().split(" ")
+        lengths = unpack_from("<%dI" % n, data)
+        blob = bytes(data[4 * n:])
+        ends = list(accumulate(lengths))
+        slices = map(slice, chain((0,), ends), ends)
+        text = blob.decode()
+        if len(text) == len(blob):
+            # Pure ASCII: character and byte offsets are the same
+            values = list(map(text.__getitem__, slices))
+        else:
+            values = [blob[part].decode() for part in slices]
+        if kind == b"j":
+            return list(map(json.loads, values))
+        return values
+
+
+formats = {"json": JSONSerializer(), "binary": BinarySerializer()}
+
+
+def detect(data):
+    """Returns the format data was written in"""
+    if bytes(data[:len(BinarySerializer.magic)]) == BinarySerializer.magic:
+        return formats["binary"]
+    return formats["json"]
+
+
+def load(data):
+    """Returns the {key: record} held in data, whatever its format"""
+    return detect(data).load(data)
+
+
+def convert(source, destination, name):
+    """Rewrites the storage file source to destination in format name"""
+    with open(source, 'rb') as f:
+        records = load(f.read())
+    with open(destination, 'wb') as f:
+        formats[name].dump(records.items(), f)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4) or sys.argv[1] not in formats:
+        print("Usage: python3 -m models.engine.serializers "
+              "<json|binary> <source> [<destination>]")
+        sys.exit(1)
+    convert(sys.argv[2], sys.argv[-1], sys.argv[1])
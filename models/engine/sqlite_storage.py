@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+"""
+Contains the class SQLiteStorage
+"""
+
+from models.base_model import Base
+from models.engine.db_storage import DBStorage, pool_options
+from os import getenv
+from sqlalchemy import create_engine, event
+
+# Applied to every new connection: write ahead logging lets readers
+# run while a save commits, NORMAL only syncs at checkpoints in WAL
+# mode, and the page cache and memory map keep hot tables in memory
+PRAGMAS = ("journal_mode=WAL", "synchronous=NORMAL", "foreign_keys=ON",
+           "busy_timeout=5000", "temp_store=MEMORY", "cache_size=-65536",
+           "mmap_size=268435456")
+
+
+class SQLiteStorage(DBStorage):
+    """interacts with an SQLite database file, through the same models
+    and session handling as DBStorage"""
+
+    def __init__(self, cache=None):
+        """Instantiate a SQLiteStorage object on the database file
+        HBNB_SQLITE_PATH (default hbnb.db), pooling its connections as
+        pool_options() describes; cache is passed on to DBStorage.
+        HBNB_SQLITE_REPLICA_PATHS lists, comma separated, database files
+        read as replicas of it, which DBStorage leaves to the sessions
+        that did not write (default none)"""
+        engine = self.__engine(getenv('HBNB_SQLITE_PATH', 'hbnb.db'))
+        self.__replicas = [self.__engine(path) for path in
+                           getenv('HBNB_SQLITE_REPLICA_PATHS',
+                                  '').split(',') if path]
+        super().__init__(engine, cache, self.__replicas)
+
+    def reload(self):
+        """Creates the tables missing from the replica files, as nothing
+        replicates the primary to them, then reloads as DBStorage"""
+        for replica in self.__replicas:
+            Base.metadata.create_all(replica)
+        super().reload()
+
+    @classmethod
+    def __engine(cls, path):
+        """Returns an engine on the database file path"""
+        engine = create_engine('sqlite:///{}'.format(path),
+                               connect_args={"check_same_thread": False},
+                               **pool_options())
+        event.listen(engine, "connect", cls.__set_pragmas)
+        return engine
+
+    @staticmethod
+    def __set_pragmas(connection, record):
+        """Sets PRAGMAS on a new connection"""
+        cursor = connection.cursor()
+        for pragma in PRAGMAS:
+            cursor.execute("PRAGMA " + pragma)
+        cursor.close()
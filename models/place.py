@@ -3,6 +3,7 @@
 from sqlalchemy.ext.declarative import declarative_base
 from models.base_model import BaseModel, Base
 from sqlalchemy import Column, Table, String, Integer, Float, ForeignKey
+from sqlalchemy import Index
 from sqlalchemy.orm import relationship
 from os import getenv
 import models
@@ -17,7 +18,8 @@ place_amenity = Table("place_amenity", Base.metadata,
                       Column("amenity_id", String(60),
                              ForeignKey("amenities.id"),
                              primary_key=True,
-                             nullable=False))
+                             nullable=False,
+                             index=True))
 
 
 class Place(BaseModel, Base):
@@ -38,8 +40,12 @@ class Place(BaseModel, Base):
         amenity_ids: list of Amenity ids
     """
     __tablename__ = "places"
+    # Places of a city by price; its city_id prefix indexes the foreign key
+    __table_args__ = (Index("ix_places_city_id_price_by_night",
+                            "city_id", "price_by_night"),)
     city_id = Column(String(60), ForeignKey("cities.id"), nullable=False)
-    user_id = Column(String(60), ForeignKey("users.id"), nullable=False)
+    user_id = Column(String(60), ForeignKey("users.id"), nullable=False,
+                     index=True)
     name = Column(String(128), nullable=False)
     description = Column(String(1024))
     number_rooms = Column(Integer, nullable=False, default=0)
@@ -50,7 +56,7 @@ class Place(BaseModel, Base):
     longitude = Column(Float)
     amenity_ids = []
 
-    if getenv("HBNB_TYPE_STORAGE") == "db":
+    if getenv("HBNB_TYPE_STORAGE") in ("db", "sqlite"):
         # Define a one-to-many relationship between Place and Review
         reviews = relationship("Review", cascade='all, delete, delete-orphan',
                                backref="place")
@@ -63,18 +69,7 @@ class Place(BaseModel, Base):
         @property
         def reviews(self):
             """ Returns a list of reviews associated with the place """
-            var = models.storage.all()
-            lista = []
-            result = []
-            for key in var:
-                review = key.replace('.', ' ')
-                review = shlex.split(review)
-                if (review[0] == 'Review'):
-                    lista.append(var[key])
-            for elem in lista:
-                if (elem.place_id == self.id):
-                    result.append(elem)
-            return (result)
+            return models.storage.children("Review", "place_id", self.id)
 
         @property
         def amenities(self):
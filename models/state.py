@@ -6,7 +6,7 @@ from sqlalchemy.orm import relationship
 from sqlalchemy import Column, Integer, String
 import models
 from models.city import City
-import shlex
+from os import getenv
 
 
 class State(BaseModel, Base):
@@ -15,30 +15,14 @@ class State(BaseModel, Base):
         name: input name
     """
     __tablename__ = "states"
-    name = Column(String(128), nullable=False)
+    name = Column(String(128), nullable=False, index=True)
 
-    # Define a one-to-many relationship between State and City
-    cities = relationship("City", cascade='all, delete, delete-orphan',
-                          backref="state")
-
-    @property
-    def cities(self):
-        """Getter method to retrieve cities related to the State"""
-        var = models.storage.all()
-        lista = []
-        result = []
-
-        # Iterate through all objects in storage
-        for key in var:
-            city = key.replace('.', ' ')
-            city = shlex.split(city)
-
-            # Check if the object is an instance of City
-            if city[0] == 'City':
-                lista.append(var[key])
-
-        # Filter cities related to the current State
-        for elem in lista:
-            if elem.state_id == self.id:
-                result.append(elem)
-        return result
+    if getenv("HBNB_TYPE_STORAGE") in ("db", "sqlite"):
+        # Define a one-to-many relationship between State and City
+        cities = relationship("City", cascade='all, delete, delete-orphan',
+                              backref="state")
+    else:
+        @property
+        def cities(self):
+            """Getter method to retrieve cities related to the State"""
+            return models.storage.children(City, "state_id", self.id)
@@ -0,0 +1,223 @@
+#!/usr/bin/python3
+""" Module for testing async db storage"""
+import asyncio
+import importlib
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import pycodestyle
+import models
+from models.engine.async_file_storage import AsyncFileStorage
+from models.engine.async_sqlite_storage import AsyncSQLiteStorage
+from models.engine.file_storage import FileStorage
+from models.city import City
+from models.state import State
+from models.user import User
+
+
+class test_asyncDBStorage(unittest.IsolatedAsyncioTestCase):
+    """ Class to test the async db storage on SQLite """
+
+    async def asyncSetUp(self):
+        """ Set up a storage on a scratch database file """
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'hbnb.db')
+        with mock.patch.dict(os.environ, {"HBNB_SQLITE_PATH": path}):
+            self.storage = AsyncSQLiteStorage()
+        await self.storage.reload()
+
+    async def asyncTearDown(self):
+        """ Remove the database file at end of tests """
+        await self.storage.close()
+        await self.storage.dispose()
+        shutil.rmtree(self.directory)
+
+    def test_pep8_conformance_async_storage(self):
+        """ The async storage modules conform to PEP8 """
+        pep8s = pycodestyle.StyleGuide(quiet=True)
+        result = pep8s.check_files([
+            'models/engine/async_db_storage.py',
+            'models/engine/async_file_storage.py',
+            'models/engine/async_sqlite_storage.py'])
+        self.assertEqual(result.total_errors, 0)
+
+    async def test_save_all_count(self):
+        """ Saved objects are read back by all() and count() """
+        state = State(name="California")
+        await self.storage.new(state)
+        await self.storage.new(User(email="a@b.c", password="pwd"))
+        await self.storage.save()
+        self.assertEqual(await self.storage.all(State),
+                         {'State.' + state.id: state})
+        self.assertEqual(len(await self.storage.all()), 2)
+        self.assertEqual(await self.storage.count('State'), 1)
+        self.assertEqual(await self.storage.count('Foo'), 0)
+        self.assertEqual(await self.storage.count(), 2)
+        await self.storage.delete(state)
+        await self.storage.save()
+        self.assertEqual(await self.storage.count(State), 0)
+        # Sessions belong to the task of each test method
+        await self.storage.close()
+
+    async def test_get_query(self):
+        """ get() and query() eagerly load the relationships of load """
+        user = User(email="a@b.c", password="pwd")
+        await self.storage.new(user)
+        for name in ["Nevada", "Alabama", "Texas"]:
+            await self.storage.new(State(name=name))
+        await self.storage.save()
+        names = [state.name for state in await self.storage.query(
+            "State", order_by="-name", limit=2)]
+        self.assertEqual(names, ["Texas", "Nevada"])
+        await self.storage.close()
+        fetched = await self.storage.get(User, user.id, load=["places"])
+        self.assertEqual(fetched.places, [])
+        self.assertIsNone(await self.storage.get('Foo', user.id))
+        await self.storage.close()
+
+    async def test_tasks(self):
+        """ Concurrent tasks each query on a session of their own """
+        state = State(name="California")
+        await self.storage.new(state)
+        await self.storage.save()
+        for i in range(3):
+            await self.storage.new(City(name=str(i), state_id=state.id))
+        await self.storage.save()
+        await self.storage.close()
+
+        async def count():
+            try:
+                return await self.storage.count(City)
+            finally:
+                await self.storage.close()
+
+        self.assertEqual(await asyncio.gather(*[count() for i in range(10)]),
+                         [3] * 10)
+
+
+class test_asyncFileStorage(unittest.IsolatedAsyncioTestCase):
+    """ Class to test the awaitable file storage """
+
+    async def test_file_storage(self):
+        """ Calls are passed on to the file storage """
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'file.json')
+        with mock.patch.object(FileStorage, '_FileStorage__file_path', path):
+            storage = AsyncFileStorage(FileStorage())
+            state = State(name="California")
+            await storage.new(state)
+            await storage.save()
+            self.assertTrue(os.path.exists(path))
+            self.assertIs(await storage.get(State, state.id), state)
+            self.assertEqual(await storage.query(State, {"name": "Texas"}),
+                             [])
+            self.assertIn('State.' + state.id, await storage.all(State))
+            await storage.delete(state)
+            await storage.save()
+            await storage.close()
+        shutil.rmtree(directory)
+
+    @unittest.skipIf(type(models.storage) is not FileStorage,
+                     "not testing file storage")
+    def test_async_storage(self):
+        """ models.async_storage wraps models.storage once first used """
+        async_storage = models.async_storage
+        self.assertIsInstance(async_storage, AsyncFileStorage)
+        self.assertIs(models.async_storage, async_storage)
+        with self.assertRaises(AttributeError):
+            models.sync_storage
+
+
+class test_statesASGI(unittest.IsolatedAsyncioTestCase):
+    """ Class to test the ASGI application of web_flask """
+
+    async def asyncSetUp(self):
+        """ Load the application module """
+        self.asgi = importlib.import_module('web_flask.11-states_asgi')
+
+    async def request(self, path, method="GET"):
+        """ Serve one request, return its status and body """
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            sent.append(message)
+
+        await self.asgi.app({"type": "http", "method": method,
+                             "path": path}, receive, send)
+        return sent[0]["status"], sent[1]["body"].decode()
+
+    async def test_states_sqlite(self):
+        """ Concurrent requests share the pooled async storage """
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'hbnb.db')
+        with mock.patch.dict(os.environ, {"HBNB_SQLITE_PATH": path}):
+            storage = AsyncSQLiteStorage()
+        await storage.reload()
+        for name in ["Nevada", "Alabama", "Texas"]:
+            await storage.new(State(name=name))
+        await storage.save()
+        await storage.close()
+        with mock.patch.object(models, 'async_storage', storage,
+                               create=True):
+            responses = await asyncio.gather(
+                *[self.request('/states') for i in range(10)])
+            self.assertEqual(await self.request('/cities'),
+                             (404, "Not Found"))
+            self.assertEqual((await self.request('/states', "POST"))[0],
+                             405)
+        for status, body in responses:
+            self.assertEqual(status, 200)
+            self.assertLess(body.index("Alabama"), body.index("Nevada"))
+            self.assertLess(body.index("Nevada"), body.index("Texas"))
+        await storage.dispose()
+        shutil.rmtree(directory)
+
+    @unittest.skipIf(type(models.storage) is not FileStorage,
+                     "not testing file storage")
+    async def test_state_file(self):
+        """ A State is shown with its cities, or not found """
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'file.json')
+        with mock.patch.object(FileStorage, '_FileStorage__file_path', path):
+            state = State(name="California")
+            city = City(name="Fresno", state_id=state.id)
+            models.storage.new(state)
+            models.storage.new(city)
+            status, body = await self.request('/states/' + state.id)
+            self.assertEqual(status, 200)
+            self.assertIn("State: California", body)
+            self.assertIn(city.id, body)
+            self.assertIn("Not found!",
+                          (await self.request('/states/none'))[1])
+            models.storage.delete(city)
+            models.storage.delete(state)
+        shutil.rmtree(directory)
+
+    async def test_lifespan(self):
+        """ Shutdown disposes of the async storage """
+        storage = mock.AsyncMock()
+        messages = iter([{"type": "lifespan.startup"},
+                         {"type": "lifespan.shutdown"}])
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        with mock.patch.object(models, 'async_storage', storage,
+                               create=True):
+            await self.asgi.app({"type": "lifespan"}, receive, send)
+        storage.dispose.assert_awaited_once()
+        self.assertEqual(sent, ["lifespan.startup.complete",
+                                "lifespan.shutdown.complete"])
+
+
+if __name__ == "__main__":
+    unittest.main()
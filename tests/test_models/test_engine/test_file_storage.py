@@ -3,7 +3,24 @@
 import unittest
 from models.base_model import BaseModel
 from models import storage
+from models.engine import serializers
+from models.engine.file_storage import FileStorage
+from unittest import mock
+import errno
+import json
+import multiprocessing
 import os
+import shutil
+import threading
+import time
+
+
+def write_many(saves):
+    """ Saves new objects one at a time, run in another process """
+    writer = FileStorage()
+    for i in range(saves):
+        writer.new(BaseModel())
+        writer.save()
 
 
 class test_fileStorage(unittest.TestCase):
@@ -16,13 +33,22 @@ class test_fileStorage(unittest.TestCase):
             del_list.append(key)
         for key in del_list:
             del storage._FileStorage__objects[key]
+        storage._FileStorage__classes.clear()
+        storage._FileStorage__dirty.clear()
+        storage._FileStorage__unloaded.clear()
+        storage._FileStorage__dirty_shards.clear()
+        storage._FileStorage__children.clear()
+        storage._FileStorage__parents.clear()
 
     def tearDown(self):
         """ Remove storage file at end of tests """
-        try:
-            os.remove('file.json')
-        except:
-            pass
+        for path in ('file.json', 'file.json.journal', 'file.json.index',
+                     'file.json.lock'):
+            try:
+                os.remove(path)
+            except:
+                pass
+        shutil.rmtree('file.json.d', ignore_errors=True)
 
     def test_obj_list_empty(self):
         """ __objects is initially empty """
@@ -102,6 +128,778 @@ class test_fileStorage(unittest.TestCase):
             temp = key
         self.assertEqual(temp, 'BaseModel' + '.' + _id)
 
+    def test_all_cls(self):
+        """ all(cls) only returns objects of that class """
+        from models.state import State
+        state = State()
+        storage.new(state)
+        storage.new(BaseModel())
+        self.assertEqual(storage.all(State),
+                         {'State.' + state.id: state})
+
+    def test_all_cls_name(self):
+        """ all() accepts the class name as a string """
+        from models.state import State
+        state = State()
+        storage.new(state)
+        self.assertEqual(storage.all('State'), storage.all(State))
+        self.assertEqual(storage.all('City'), {})
+
+    def test_all_cls_after_delete(self):
+        """ Deleted objects leave their class bucket """
+        from models.state import State
+        state = State()
+        storage.new(state)
+        storage.delete(state)
+        self.assertEqual(storage.all(State), {})
+
+    def test_all_cls_after_reload(self):
+        """ Reloaded objects are filed under their class """
+        from models.state import State
+        state = State()
+        storage.new(state)
+        storage.save()
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        storage.reload()
+        self.assertEqual(list(storage.all(State)), ['State.' + state.id])
+
+    def test_all_snapshot(self):
+        """ all() can be iterated while instances are added or deleted """
+        from models.state import State
+        old = State()
+        storage.new(old)
+        view = storage.all()
+        states = storage.all(State)
+        self.assertIs(storage.all(), view)
+        for key in view:
+            storage.new(State())
+            storage.delete(old)
+        self.assertEqual(list(view), ['State.' + old.id])
+        self.assertEqual(list(states), ['State.' + old.id])
+        self.assertEqual(len(storage.all()), 1)
+        self.assertEqual(len(storage.all(State)), 1)
+        self.assertIsNot(storage.all(), view)
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_JOURNAL": "1"})
+    def test_journal_save(self):
+        """ Journal mode appends only the changed objects """
+        journal = FileStorage()
+        new = BaseModel()
+        journal.new(new)
+        journal.save()
+        journal.new(BaseModel())
+        journal.delete(new)
+        journal.save()
+        self.assertFalse(os.path.exists('file.json'))
+        with open('file.json.journal') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0][:2], ["u", "BaseModel." + new.id])
+        self.assertIn(["d", "BaseModel." + new.id], records)
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_JOURNAL": "1"})
+    def test_journal_reload(self):
+        """ Reload replays the journal on top of the snapshot """
+        journal = FileStorage()
+        kept = BaseModel()
+        gone = BaseModel()
+        journal.new(kept)
+        journal.new(gone)
+        journal.compact()
+        kept.name = "kept"
+        journal.new(kept)
+        journal.delete(gone)
+        journal.save()
+        with open('file.json.journal', 'a') as f:
+            f.write('["u", "BaseModel.torn"')
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        journal.reload()
+        self.assertEqual(list(journal.all()), ['BaseModel.' + kept.id])
+        self.assertEqual(journal.all()['BaseModel.' + kept.id].name, "kept")
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_JOURNAL": "1",
+                                  "HBNB_FILE_JOURNAL_MAX": "0"})
+    def test_journal_compaction(self):
+        """ A journal larger than the snapshot is folded back into it """
+        journal = FileStorage()
+        journal.new(BaseModel())
+        journal.save()
+        self.assertFalse(os.path.exists('file.json.journal'))
+        with open('file.json') as f:
+            self.assertEqual(len(json.load(f)), 1)
+
+    def test_save_drops_journal(self):
+        """ A full save makes an older journal obsolete """
+        with open('file.json.journal', 'w') as f:
+            f.write('["d", "BaseModel.1"]\n')
+        storage.save()
+        self.assertFalse(os.path.exists('file.json.journal'))
+
+    def test_save_leaves_no_temporary_file(self):
+        """ The snapshot is written aside and renamed over file.json """
+        storage.new(BaseModel())
+        storage.save()
+        leftovers = [name for name in os.listdir('.')
+                     if name.startswith('file.json') and
+                     name not in ('file.json', 'file.json.lock')]
+        self.assertEqual(leftovers, [])
+
+    def test_lock_file_only_for_writes(self):
+        """ Reading takes the lock file only once a writer made it """
+        storage.reload()
+        storage.close()
+        self.assertFalse(os.path.exists('file.json.lock'))
+        storage.new(BaseModel())
+        storage.save()
+        self.assertTrue(os.path.exists('file.json.lock'))
+
+    def test_lock_file_denied(self):
+        """ A lock file readers cannot open is read without """
+        obj = BaseModel()
+        storage.new(obj)
+        storage.save()
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        builtin_open = open
+
+        def denied(path, *args, **kwargs):
+            """ open() of a read-only data directory """
+            if path == 'file.json.lock':
+                raise PermissionError(errno.EACCES, "Permission denied")
+            return builtin_open(path, *args, **kwargs)
+        with mock.patch('builtins.open', denied):
+            storage.reload()
+        self.assertIn('BaseModel.' + obj.id, storage.all())
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_COMMIT_WINDOW": "60"})
+    def test_commit_window(self):
+        """ Saves inside the commit window share a single write """
+        grouped = FileStorage()
+        for i in range(3):
+            grouped.new(BaseModel())
+            grouped.save()
+        self.assertFalse(os.path.exists('file.json'))
+        grouped.flush()
+        with open('file.json') as f:
+            self.assertEqual(len(json.load(f)), 3)
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_COMMIT_WINDOW": "60"})
+    def test_commit_window_reload(self):
+        """ Reload writes pending saves before reading the file """
+        grouped = FileStorage()
+        new = BaseModel()
+        grouped.new(new)
+        grouped.save()
+        grouped.reload()
+        self.assertIn('BaseModel.' + new.id, grouped.all())
+        self.assertTrue(os.path.exists('file.json'))
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_COMMIT_WINDOW": "60"})
+    def test_commit_window_close(self):
+        """ Close leaves pending saves to the flusher and keeps them """
+        grouped = FileStorage()
+        new = BaseModel()
+        grouped.new(new)
+        grouped.save()
+        grouped.close()
+        self.assertFalse(os.path.exists('file.json'))
+        self.assertIn('BaseModel.' + new.id, grouped.all())
+        grouped.flush()
+        self.assertTrue(os.path.exists('file.json'))
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_WRITE_BEHIND": "1",
+                                  "HBNB_FILE_FLUSH_INTERVAL": "60",
+                                  "HBNB_FILE_FLUSH_DIRTY": "3"})
+    def test_write_behind_dirty_limit(self):
+        """ The flusher writes early once enough keys changed """
+        behind = FileStorage()
+        for i in range(3):
+            behind.new(BaseModel())
+            behind.save()
+        for i in range(100):
+            if os.path.exists('file.json'):
+                break
+            time.sleep(0.05)
+        behind.flush()
+        with open('file.json') as f:
+            self.assertEqual(len(json.load(f)), 3)
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_WRITE_BEHIND": "1",
+                                  "HBNB_FILE_FLUSH_INTERVAL": "0.05"})
+    def test_write_behind_flush_barrier(self):
+        """ flush() returns with every save made before it on disk """
+        behind = FileStorage()
+        for i in range(50):
+            behind.new(BaseModel())
+            behind.save()
+        behind.flush()
+        with open('file.json') as f:
+            self.assertEqual(len(json.load(f)), 50)
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_WRITE_BEHIND": "1",
+                                  "HBNB_FILE_FLUSH_INTERVAL": "0.05"})
+    def test_write_behind_failure(self):
+        """ The flusher survives a failed write and retries it """
+        behind = FileStorage()
+        bad = BaseModel()
+        bad.bad = object()
+        with self.assertLogs('models.engine.file_storage', 'ERROR') as cm:
+            behind.new(bad)
+            behind.save()
+            for i in range(100):
+                if cm.records:
+                    break
+                time.sleep(0.05)
+            del bad.bad
+            behind.new(BaseModel())
+            behind.save()
+            for i in range(100):
+                if os.path.exists('file.json'):
+                    break
+                time.sleep(0.05)
+        self.assertTrue(behind._FileStorage__flusher.is_alive())
+        with open('file.json') as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_LAZY": "1"})
+    def test_lazy_reload(self):
+        """ Lazy reload only builds the classes that are used """
+        from models.state import State
+        lazy = FileStorage()
+        state = State(name="California")
+        lazy.new(state)
+        lazy.new(BaseModel())
+        lazy.save()
+        self.assertTrue(os.path.exists('file.json.index'))
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        lazy.reload()
+        self.assertEqual(len(storage._FileStorage__objects), 0)
+        states = lazy.all(State)
+        self.assertEqual(states['State.' + state.id].name, "California")
+        self.assertEqual(len(storage._FileStorage__objects), 1)
+        self.assertEqual(len(lazy.all()), 2)
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_LAZY": "1"})
+    def test_lazy_save_unloaded(self):
+        """ Records that were never loaded survive a save """
+        lazy = FileStorage()
+        new = BaseModel()
+        lazy.new(new)
+        lazy.save()
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        lazy.reload()
+        lazy.new(BaseModel())
+        lazy.save()
+        self.assertIn('BaseModel.' + new.id, lazy.all())
+        with open('file.json') as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_LAZY": "1"})
+    def test_lazy_iter(self):
+        """ iter() decodes unloaded records without keeping them """
+        from models.state import State
+        lazy = FileStorage()
+        states = [State(name=str(i)) for i in range(5)]
+        for state in states:
+            lazy.new(state)
+        lazy.save()
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        lazy.reload()
+        names = [state.name for state in lazy.iter(State, batch_size=2)]
+        self.assertEqual(sorted(names), [str(i) for i in range(5)])
+        self.assertEqual(len(storage._FileStorage__objects), 0)
+        lazy.delete(next(lazy.iter(State)))
+        self.assertEqual(lazy.count(State), 4)
+        with self.assertRaises(KeyError):
+            lazy.delete(State())
+        self.assertEqual(len(lazy.all(State)), 4)
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_LAZY": "1"})
+    def test_lazy_count(self):
+        """ count() includes the records that were not loaded """
+        from models.state import State
+        lazy = FileStorage()
+        lazy.new(State())
+        lazy.new(BaseModel())
+        lazy.save()
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        lazy.reload()
+        self.assertEqual(lazy.count(State), 1)
+        self.assertEqual(lazy.count(), 2)
+        self.assertEqual(len(storage._FileStorage__objects), 0)
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_LAZY": "1"})
+    def test_lazy_get(self):
+        """ get() only decodes the record it looks up """
+        from models.state import State
+        lazy = FileStorage()
+        state = State(name="California")
+        lazy.new(state)
+        lazy.new(State(name="Nevada"))
+        lazy.save()
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        lazy.reload()
+        self.assertEqual(lazy.get(State, state.id).name, "California")
+        self.assertEqual(list(storage._FileStorage__objects),
+                         ['State.' + state.id])
+        self.assertIs(lazy.get(State, state.id), lazy.get(State, state.id))
+        self.assertEqual(lazy.query(State, where={"id": state.id}),
+                         [lazy.get(State, state.id)])
+        self.assertEqual(len(storage._FileStorage__objects), 1)
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_LAZY": "1"})
+    def test_lazy_stale_index(self):
+        """ An index older than the JSON file is ignored """
+        lazy = FileStorage()
+        lazy.new(BaseModel())
+        lazy.save()
+        with open('file.json', 'a') as f:
+            f.write(' ')
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        lazy.reload()
+        self.assertEqual(len(storage._FileStorage__objects), 1)
+
+    def test_reload_every_class(self):
+        """ Every model class comes back with its attributes and dates """
+        from models.engine.file_storage import classes
+        saved = {}
+        for name, cls in classes.items():
+            obj = cls()
+            obj.name = name
+            storage.new(obj)
+            saved['{}.{}'.format(name, obj.id)] = obj
+        storage.save()
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        storage.reload()
+        for key, obj in saved.items():
+            loaded = storage.all()[key]
+            self.assertIs(type(loaded), type(obj))
+            self.assertEqual(loaded.to_dict(), obj.to_dict())
+            self.assertEqual(loaded.created_at, obj.created_at)
+            loaded.name = "renamed"
+            self.assertEqual(loaded.name, "renamed")
+
+    def test_reload_whole_seconds(self):
+        """ Timestamps without microseconds are read back """
+        with open('file.json', 'w') as f:
+            json.dump({'BaseModel.1': {'__class__': 'BaseModel', 'id': '1',
+                                       'created_at': '2024-01-01T10:00:00',
+                                       'updated_at': '2024-01-01T10:00:00'}},
+                      f)
+        storage.reload()
+        loaded = storage.all()['BaseModel.1']
+        self.assertEqual(loaded.created_at.hour, 10)
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_SHARDED": "1"})
+    def test_sharded_save(self):
+        """ Each class is saved in its own shard """
+        from models.state import State
+        sharded = FileStorage()
+        sharded.new(State())
+        sharded.new(BaseModel())
+        sharded.save()
+        self.assertEqual(sorted(os.listdir('file.json.d')),
+                         ['BaseModel.json', 'State.json'])
+        self.assertFalse(os.path.exists('file.json'))
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_SHARDED": "1"})
+    def test_sharded_dirty_only(self):
+        """ Saving one class leaves the other shards untouched """
+        from models.state import State
+        sharded = FileStorage()
+        sharded.new(State())
+        sharded.new(BaseModel())
+        sharded.save()
+        os.utime('file.json.d/BaseModel.json', ns=(0, 0))
+        sharded.new(State())
+        sharded.save()
+        self.assertEqual(os.stat('file.json.d/BaseModel.json').st_mtime_ns,
+                         0)
+        with open('file.json.d/State.json') as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_SHARDED": "1",
+                                  "HBNB_FILE_SHARD_BUCKETS": "BaseModel:4"})
+    def test_sharded_buckets_reload(self):
+        """ Hash buckets split a class and are all read back """
+        sharded = FileStorage()
+        objs = [BaseModel() for i in range(20)]
+        for obj in objs:
+            sharded.new(obj)
+        sharded.save()
+        self.assertTrue(all(name.startswith('BaseModel.') and
+                            name.endswith('-of-4.json')
+                            for name in os.listdir('file.json.d')))
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        sharded.reload()
+        self.assertEqual(len(sharded.all(BaseModel)), 20)
+
+    def test_sharded_from_single_file(self):
+        """ A single JSON file is moved over to shards on save """
+        storage.new(BaseModel())
+        storage.save()
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        with mock.patch.dict(os.environ, {"HBNB_FILE_SHARDED": "1"}):
+            sharded = FileStorage()
+        sharded.reload()
+        sharded.save()
+        with open('file.json.d/BaseModel.json') as f:
+            self.assertEqual(len(json.load(f)), 1)
+
+    def test_sharded_turned_off(self):
+        """ Shards written last are read without sharding, and the next
+        save moves them back to a single file """
+        from models.state import State
+        with mock.patch.dict(os.environ, {"HBNB_FILE_SHARDED": "1"}):
+            sharded = FileStorage()
+        state = State(name="California")
+        sharded.new(state)
+        sharded.save()
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        storage.reload()
+        self.assertIn('State.' + state.id, storage.all(State))
+        storage.new(BaseModel())
+        storage.save()
+        with open('file.json') as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+    def test_sharded_turned_on_again(self):
+        """ A single file saved after the shards replaces all of them """
+        from models.state import State
+        with mock.patch.dict(os.environ, {"HBNB_FILE_SHARDED": "1"}):
+            sharded = FileStorage()
+        obj = BaseModel()
+        sharded.new(obj)
+        sharded.new(State())
+        sharded.save()
+        os.utime('file.json.d', ns=(0, 0))
+        storage.delete(obj)
+        storage.save()
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        sharded.reload()
+        self.assertEqual(sharded.count(BaseModel), 0)
+        self.assertEqual(sharded.count(State), 1)
+        sharded.save()
+        self.assertEqual(os.listdir('file.json.d'), ['State.json'])
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_FORMAT": "binary"})
+    def test_binary_format(self):
+        """ The binary format is saved and reloaded """
+        from models.state import State
+        binary = FileStorage()
+        state = State(name="California")
+        binary.new(state)
+        binary.save()
+        with open('file.json', 'rb') as f:
+            self.assertTrue(f.read().startswith(b'HBNB'))
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        storage.reload()
+        loaded = storage.all(State)['State.' + state.id]
+        self.assertEqual(loaded.to_dict(), state.to_dict())
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_SHARDED": "1",
+                                  "HBNB_FILE_FORMAT": "binary"})
+    def test_binary_shards(self):
+        """ Shards are rewritten in the format being used """
+        with mock.patch.dict(os.environ, {"HBNB_FILE_FORMAT": "json"}):
+            sharded = FileStorage()
+        sharded.new(BaseModel())
+        sharded.save()
+        self.assertEqual(os.listdir('file.json.d'), ['BaseModel.json'])
+        storage._FileStorage__objects.clear()
+        storage._FileStorage__classes.clear()
+        binary = FileStorage()
+        binary.reload()
+        binary.save()
+        self.assertEqual(os.listdir('file.json.d'), ['BaseModel.bin'])
+        self.assertEqual(len(binary.all()), 1)
+
+    def test_close_unchanged(self):
+        """ close() reads nothing when the file did not change """
+        new = BaseModel()
+        storage.new(new)
+        storage.save()
+        storage.close()
+        self.assertIs(storage.all()['BaseModel.' + new.id], new)
+
+    def test_close_changed(self):
+        """ close() reads the file again once it changed """
+        new = BaseModel()
+        storage.new(new)
+        storage.save()
+        with open('file.json') as f:
+            records = json.load(f)
+        records['BaseModel.' + new.id]['name'] = "changed"
+        with open('file.json', 'w') as f:
+            json.dump(records, f)
+        storage.close()
+        self.assertEqual(storage.all()['BaseModel.' + new.id].name,
+                         "changed")
+
+    def test_reload_does_not_block_readers(self):
+        """ Other threads read and add instances while the file is
+        parsed, and what they add is kept """
+        from models.city import City
+        from models.state import State
+        state = State(name="California")
+        storage.new(state)
+        storage.save()
+        city = City(name="Fresno", state_id=state.id)
+        load = serializers.load
+
+        def parse(data):
+            """ Runs a reader and a writer thread in the middle """
+            def other():
+                """ Reads, then adds the city """
+                self.assertIn('State.' + state.id, storage.all(State))
+                storage.new(city)
+            thread = threading.Thread(target=other)
+            thread.start()
+            thread.join(2)
+            self.assertFalse(thread.is_alive())
+            return load(data)
+        with mock.patch.object(serializers, 'load', parse):
+            storage.reload()
+        self.assertIs(storage.all(City)['City.' + city.id], city)
+        reloaded = storage.all(State)['State.' + state.id]
+        self.assertIsNot(reloaded, state)
+        self.assertEqual(reloaded.cities, [city])
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_JOURNAL": "1"})
+    def test_close_journal_delta(self):
+        """ close() only replays the records appended to the journal """
+        journal = FileStorage()
+        old = BaseModel()
+        journal.new(old)
+        journal.save()
+        journal.close()
+        with open('file.json.journal', 'a') as f:
+            f.write('["u", "BaseModel.appended", {"__class__": "BaseModel",'
+                    ' "id": "appended"}]\n')
+        journal.close()
+        self.assertIs(journal.all()['BaseModel.' + old.id], old)
+        self.assertIn('BaseModel.appended', journal.all())
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_SHARDED": "1"})
+    def test_close_changed_shard(self):
+        """ close() only reads the shards that changed """
+        from models.state import State
+        sharded = FileStorage()
+        state = State(name="California")
+        new = BaseModel()
+        sharded.new(state)
+        sharded.new(new)
+        sharded.save()
+        with open('file.json.d/State.json') as f:
+            records = json.load(f)
+        records['State.' + state.id]['name'] = "Nevada"
+        with open('file.json.d/State.json', 'w') as f:
+            json.dump(records, f)
+        sharded.close()
+        self.assertIs(sharded.all()['BaseModel.' + new.id], new)
+        self.assertEqual(sharded.all(State)['State.' + state.id].name,
+                         "Nevada")
+
+    def test_children(self):
+        """ State.cities reads the cities indexed under the state """
+        from models.state import State
+        from models.city import City
+        state = State(name="California")
+        city = City(name="Fresno", state_id=state.id)
+        storage.new(state)
+        storage.new(city)
+        storage.new(City(name="Reno", state_id="other"))
+        self.assertEqual(state.cities, [city])
+        storage.delete(city)
+        self.assertEqual(state.cities, [])
+
+    def test_children_foreign_key_change(self):
+        """ Assigning a foreign key moves the child to its new parent """
+        from models.city import City
+        from models.place import Place
+        from models.review import Review
+        place = Place(city_id="c", user_id="u")
+        review = Review(place_id="elsewhere", user_id="u")
+        storage.new(place)
+        storage.new(review)
+        review.place_id = place.id
+        self.assertEqual(place.reviews, [review])
+        self.assertEqual(storage.children(Review, "place_id", "elsewhere"),
+                         [])
+        self.assertEqual(storage.children(Place, "user_id", "u"), [place])
+
+    def test_query(self):
+        """ query() filters, sorts and pages the objects of a class """
+        from models.state import State
+        for name in ["Nevada", "Alabama", "Texas", "California"]:
+            storage.new(State(name=name))
+        storage.new(BaseModel())
+        names = [state.name
+                 for state in storage.query(State, order_by="name")]
+        self.assertEqual(names, ["Alabama", "California", "Nevada", "Texas"])
+        names = [state.name for state in storage.query(
+            "State", order_by="-name", limit=2, offset=1)]
+        self.assertEqual(names, ["Nevada", "California"])
+        states = storage.query(State, where={"name": "Texas"})
+        self.assertEqual([state.name for state in states], ["Texas"])
+        self.assertEqual(storage.query(State, where={"id": states[0].id}),
+                         states)
+        self.assertEqual(storage.query(State, where={"id": "none"}), [])
+
+    def test_query_foreign_key(self):
+        """ query() on a foreign key reads its index """
+        from models.city import City
+        cities = [City(name=name, state_id="s") for name in "bca"]
+        for city in cities:
+            storage.new(city)
+        storage.new(City(name="d", state_id="other"))
+        result = storage.query(City, where={"state_id": "s", "name": "b"})
+        self.assertEqual(result, [cities[0]])
+        result = storage.query(City, where={"state_id": "s"},
+                               order_by="name", limit=2)
+        self.assertEqual([city.name for city in result], ["a", "b"])
+
+    def test_iter(self):
+        """ iter() yields the objects of a class, or of every class """
+        from models.state import State
+        state = State()
+        new = BaseModel()
+        storage.new(state)
+        storage.new(new)
+        self.assertEqual(list(storage.iter(State)), [state])
+        self.assertEqual(list(storage.iter('State')), [state])
+        storage.new(State())
+        self.assertEqual(list(storage.iter()), list(storage.all().values()))
+        objs = storage.iter()
+        self.assertIs(next(objs), state)
+        storage.new(State())
+        self.assertEqual(len(list(objs)), 2)
+
+    def test_count(self):
+        """ count() counts the objects of a class, or of every class """
+        from models.state import State
+        state = State()
+        storage.new(state)
+        storage.new(State())
+        storage.new(BaseModel())
+        self.assertEqual(storage.count(State), 2)
+        self.assertEqual(storage.count('BaseModel'), 1)
+        self.assertEqual(storage.count('Foo'), 0)
+        self.assertEqual(storage.count(), 3)
+        storage.delete(state)
+        self.assertEqual(storage.count(State), 1)
+
+    def test_bulk_save(self):
+        """ bulk_new() objects are written by one bulk_save() """
+        from models.state import State
+        states = [State(name=str(i)) for i in range(50)]
+        storage.bulk_new(states)
+        report = storage.bulk_save()
+        self.assertEqual(report['rows'], 50)
+        self.assertGreater(report['rows_per_second'], 0)
+        with open('file.json') as f:
+            self.assertEqual(len(json.load(f)), 50)
+        self.assertEqual(storage.bulk_save()['rows'], 0)
+
+    def test_bulk_save_seconds(self):
+        """ bulk_save() does not count the wait for another write """
+        from models.state import State
+        write_lock = FileStorage._FileStorage__write_lock
+        held = threading.Event()
+
+        def write():
+            with write_lock:
+                held.set()
+                time.sleep(0.5)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        held.wait()
+        storage.bulk_new([State(name=str(i)) for i in range(50)])
+        report = storage.bulk_save()
+        writer.join()
+        self.assertEqual(report['rows'], 50)
+        self.assertLess(report['seconds'], 0.5)
+
+    def test_get(self):
+        """ get() returns the object of a class with an id, or None """
+        from models.state import State
+        state = State()
+        storage.new(state)
+        self.assertIs(storage.get(State, state.id), state)
+        self.assertIs(storage.get('State', state.id), state)
+        self.assertIsNone(storage.get('City', state.id))
+        self.assertIsNone(storage.get(State, "none"))
+
+    def test_children_after_reload(self):
+        """ Reloaded children are indexed under their parents """
+        from models.state import State
+        from models.city import City
+        state = State(name="California")
+        storage.new(state)
+        storage.new(City(name="Fresno", state_id=state.id))
+        storage.save()
+        storage.reload()
+        self.assertEqual([city.name for city in state.cities], ["Fresno"])
+
+    def write_concurrently(self, processes=4, saves=25):
+        """ Runs writer processes at once, returns how many objects the
+        file holds once they are done """
+        context = multiprocessing.get_context("fork")
+        writers = [context.Process(target=write_many, args=(saves,))
+                   for i in range(processes)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+            self.assertEqual(writer.exitcode, 0)
+        reader = FileStorage()
+        reader.reload()
+        return len(reader.all())
+
+    def test_concurrent_writers(self):
+        """ No process loses the saves of the others """
+        self.assertEqual(self.write_concurrently(), 100)
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_JOURNAL": "1",
+                                  "HBNB_FILE_JOURNAL_MAX": "2048"})
+    def test_concurrent_journal_writers(self):
+        """ No process loses the saves of the others in journal mode """
+        self.assertEqual(self.write_concurrently(), 100)
+
+    @mock.patch.dict(os.environ, {"HBNB_FILE_JOURNAL": "1",
+                                  "HBNB_FILE_JOURNAL_MAX": "2048",
+                                  "HBNB_FILE_SHARDED": "1"})
+    def test_concurrent_sharded_writers(self):
+        """ No process loses the saves of the others in sharded mode """
+        self.assertEqual(self.write_concurrently(), 100)
+
+    def test_reload_drops_deleted(self):
+        """ Reload forgets saved objects another process deleted """
+        gone = BaseModel()
+        kept = BaseModel()
+        storage.new(gone)
+        storage.save()
+        storage.new(kept)
+        with open('file.json', 'w') as f:
+            json.dump({}, f)
+        storage.reload()
+        self.assertEqual(list(storage.all()), ['BaseModel.' + kept.id])
+
     def test_storage_var_created(self):
         """ FileStorage object storage created """
         from models.engine.file_storage import FileStorage
@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+""" Module for testing the result cache backends"""
+import unittest
+from unittest import mock
+import pycodestyle
+from models.engine import result_cache
+
+
+class test_resultCache(unittest.TestCase):
+    """ Class to test the LRU result cache """
+
+    def test_pep8_conformance_result_cache(self):
+        """ models/engine/result_cache.py conforms to PEP8 """
+        pep8s = pycodestyle.StyleGuide(quiet=True)
+        result = pep8s.check_files(['models/engine/result_cache.py'])
+        self.assertEqual(result.total_errors, 0)
+
+    def test_lru(self):
+        """ The least recently used result is evicted first """
+        cache = result_cache.backends["lru"](size=2)
+        cache.set(("State", 1), "a")
+        cache.set(("State", 2), "b")
+        self.assertEqual(cache.get(("State", 1)), "a")
+        cache.set(("City", 3), "c")
+        self.assertIsNone(cache.get(("State", 2)))
+        self.assertEqual(cache.get(("State", 1)), "a")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_ttl(self):
+        """ Results expire ttl seconds after they were stored """
+        cache = result_cache.LRUCache(ttl=10)
+        with mock.patch('time.monotonic', return_value=100):
+            cache.set(("State", 1), "a")
+        with mock.patch('time.monotonic', return_value=109):
+            self.assertEqual(cache.get(("State", 1)), "a")
+        with mock.patch('time.monotonic', return_value=111):
+            self.assertIsNone(cache.get(("State", 1)))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate(self):
+        """ invalidate() forgets the results of one class only """
+        cache = result_cache.LRUCache()
+        cache.set(("State", 1), "a")
+        cache.set(("State", 2), "b")
+        cache.set(("City", 1), "c")
+        cache.invalidate("State")
+        self.assertIsNone(cache.get(("State", 1)))
+        self.assertIsNone(cache.get(("State", 2)))
+        self.assertEqual(cache.get(("City", 1)), "c")
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+""" Module for testing the file storage formats"""
+import io
+import json
+import os
+import unittest
+from datetime import datetime
+from models.engine import serializers
+from models.place import Place
+from models.state import State
+
+
+class test_serializers(unittest.TestCase):
+    """ Class to test the JSON and binary storage formats """
+
+    def setUp(self):
+        """ Records of a few classes, with uneven attributes """
+        place = Place(name="Café Loft", number_rooms=3, latitude=37.77,
+                      amenity_ids=["a", "b"])
+        state = State(name="California")
+        other = State(id="not-a-uuid", name="Nevada")
+        other.flag = True
+        self.records = {}
+        for obj in (place, state, other):
+            key = "{}.{}".format(type(obj).__name__, obj.id)
+            self.records[key] = obj.to_dict()
+
+    def tearDown(self):
+        """ Remove the converted files """
+        for path in ('file.json', 'file.bin'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def dump(self, name):
+        """ Bytes of self.records in the format name """
+        f = io.BytesIO()
+        serializers.formats[name].dump(self.records.items(), f)
+        return f.getvalue()
+
+    def test_json_round_trip(self):
+        """ JSON files load back to the same records """
+        data = self.dump("json")
+        self.assertEqual(json.loads(data), self.records)
+        self.assertEqual(serializers.load(data), self.records)
+
+    def test_json_offsets(self):
+        """ JSON offsets point at each record value """
+        f = io.BytesIO()
+        index = serializers.formats["json"].dump(self.records.items(), f)
+        data = f.getvalue()
+        for name, records in index.items():
+            for key, (offset, length) in records.items():
+                self.assertEqual(json.loads(data[offset:offset + length]),
+                                 self.records[key])
+
+    def test_binary_round_trip(self):
+        """ Binary files load back to the same records """
+        data = self.dump("binary")
+        self.assertIs(serializers.detect(data), serializers.formats["binary"])
+        loaded = serializers.load(data)
+        self.assertEqual(set(loaded), set(self.records))
+        for key, record in loaded.items():
+            self.assertIsInstance(record["created_at"], datetime)
+            record["created_at"] = record["created_at"].isoformat()
+            record["updated_at"] = record["updated_at"].isoformat()
+            self.assertEqual(record, self.records[key])
+
+    def test_binary_smaller(self):
+        """ Binary files are smaller than JSON ones """
+        for i in range(50):
+            state = State(name="State {}".format(i))
+            self.records["State." + state.id] = state.to_dict()
+        self.assertLess(len(self.dump("binary")), len(self.dump("json")))
+
+    def test_convert(self):
+        """ Files convert from one format to the other and back """
+        with open('file.json', 'wb') as f:
+            f.write(self.dump("json"))
+        serializers.convert('file.json', 'file.bin', "binary")
+        with open('file.bin', 'rb') as f:
+            self.assertIs(serializers.detect(f.read()),
+                          serializers.formats["binary"])
+        serializers.convert('file.bin', 'file.json', "json")
+        with open('file.json') as f:
+            self.assertEqual(json.load(f), self.records)
+
+
+if __name__ == "__main__":
+    unittest.main()
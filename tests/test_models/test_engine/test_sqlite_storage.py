@@ -0,0 +1,365 @@
+#!/usr/bin/python3
+""" Module for testing sqlite storage"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+import pycodestyle
+from sqlalchemy import event
+from models.engine import migrations
+from models.engine.result_cache import LRUCache
+from models.engine.sqlite_storage import SQLiteStorage
+from models.city import City
+from models.place import Place
+from models.state import State
+from models.user import User
+
+
+class test_sqliteStorage(unittest.TestCase):
+    """ Class to test the sqlite storage method """
+
+    def setUp(self):
+        """ Set up a storage on a scratch database file """
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'hbnb.db')
+        with mock.patch.dict(os.environ, {"HBNB_SQLITE_PATH": self.path}):
+            self.storage = SQLiteStorage()
+        self.storage.reload()
+
+    def tearDown(self):
+        """ Remove the database file at end of tests """
+        self.storage.close()
+        shutil.rmtree(self.directory)
+
+    def test_pep8_conformance_sqlite_storage(self):
+        """ models/engine/sqlite_storage.py conforms to PEP8 """
+        pep8s = pycodestyle.StyleGuide(quiet=True)
+        result = pep8s.check_files(['models/engine/sqlite_storage.py'])
+        self.assertEqual(result.total_errors, 0)
+
+    def test_wal(self):
+        """ The database is switched to write ahead logging """
+        self.storage.all()
+        with sqlite3.connect(self.path) as db:
+            self.assertEqual(db.execute('PRAGMA journal_mode').fetchone(),
+                             ('wal',))
+
+    def test_all_cls(self):
+        """ all(cls) only returns saved objects of that class """
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.new(User(email="a@b.c", password="pwd"))
+        self.storage.save()
+        self.assertEqual(self.storage.all(State),
+                         {'State.' + state.id: state})
+        self.assertEqual(list(self.storage.all('State')),
+                         ['State.' + state.id])
+        # A name parsed from input is equal to the key, not the same str
+        self.assertEqual(list(self.storage.all("".join(["St", "ate"]))),
+                         ['State.' + state.id])
+        self.assertEqual(len(self.storage.all()), 2)
+
+    def test_delete(self):
+        """ Deleted objects are gone once saved """
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.save()
+        self.storage.delete(state)
+        self.storage.save()
+        self.assertEqual(self.storage.all(State), {})
+
+    def test_query(self):
+        """ query() filters, sorts and pages in SQL """
+        for name in ["Nevada", "Alabama", "Texas", "California"]:
+            self.storage.new(State(name=name))
+        self.storage.save()
+        names = [state.name for state in self.storage.query(
+            State, order_by="name")]
+        self.assertEqual(names, ["Alabama", "California", "Nevada", "Texas"])
+        names = [state.name for state in self.storage.query(
+            "State", order_by="-name", limit=2, offset=1)]
+        self.assertEqual(names, ["Nevada", "California"])
+        states = self.storage.query(State, where={"name": "Texas"})
+        self.assertEqual([state.name for state in states], ["Texas"])
+        self.assertEqual(self.storage.query("BaseModel"), [])
+
+    def test_iter(self):
+        """ iter() yields every saved object, batch by batch """
+        states = [State(name=str(i)) for i in range(5)]
+        for state in states:
+            self.storage.new(state)
+        self.storage.new(User(email="a@b.c", password="pwd"))
+        self.storage.save()
+        self.assertEqual(
+            sorted(state.name for state in self.storage.iter(State, 2)),
+            [str(i) for i in range(5)])
+        self.assertEqual(len(list(self.storage.iter())), 6)
+        self.assertEqual(list(self.storage.iter("BaseModel")), [])
+
+    def test_count(self):
+        """ count() counts rows in SQL """
+        self.storage.new(State(name="California"))
+        self.storage.new(State(name="Nevada"))
+        self.storage.new(User(email="a@b.c", password="pwd"))
+        self.storage.save()
+        self.assertEqual(self.storage.count(State), 2)
+        self.assertEqual(self.storage.count('User'), 1)
+        self.assertEqual(self.storage.count('Foo'), 0)
+        self.assertEqual(self.storage.count(), 3)
+
+    def test_get(self):
+        """ get() returns the row of a class with an id, or None """
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.save()
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.assertIs(self.storage.get('State', state.id), state)
+        self.assertIsNone(self.storage.get('User', state.id))
+        self.assertIsNone(self.storage.get('Foo', state.id))
+
+    def test_query_load(self):
+        """ load= eagerly loads relationships in one query each """
+        user = User(email="a@b.c", password="pwd")
+        state = State(name="California")
+        cities = [City(name=str(i), state_id=state.id) for i in range(5)]
+        for tier in ([user, state], cities):
+            for obj in tier:
+                self.storage.new(obj)
+            self.storage.save()
+        for city in cities:
+            self.storage.new(Place(name="Loft", city_id=city.id,
+                                   user_id=user.id))
+        self.storage.save()
+        self.storage.close()
+        statements = []
+        event.listen(self.storage._DBStorage__engine,
+                     "before_cursor_execute",
+                     lambda *args: statements.append(args[2]))
+        cities = self.storage.query(City, load=["places"])
+        self.assertEqual([len(city.places) for city in cities], [1] * 5)
+        self.assertEqual(len(statements), 2)
+        city = self.storage.get(City, cities[0].id, load=["places"])
+        self.assertEqual(len(city.places), 1)
+        self.assertEqual(len(statements), 2)
+
+    def test_bulk_save(self):
+        """ bulk_save() inserts bulk_new() objects, parents first """
+        user = User(email="a@b.c", password="pwd")
+        state = State(name="California")
+        city = City(name="Fresno", state_id=state.id)
+        places = [Place(name=str(i), city_id=city.id, user_id=user.id)
+                  for i in range(50)]
+        self.storage.new(user)
+        self.storage.bulk_new(places + [city, state])
+        report = self.storage.bulk_save()
+        self.assertEqual(report['rows'], 52)
+        self.assertGreater(report['rows_per_second'], 0)
+        self.assertEqual(self.storage.count(Place), 50)
+        self.assertEqual(self.storage.count(User), 1)
+        self.assertEqual(self.storage.get(City, city.id).name, "Fresno")
+
+    def test_cache(self):
+        """ Cached results are reused until their classes change """
+        with mock.patch.dict(os.environ, {"HBNB_SQLITE_PATH": self.path}):
+            cached = SQLiteStorage(cache=LRUCache())
+        cached.reload()
+        cached.new(State(name="California"))
+        cached.save()
+        statements = []
+        event.listen(cached._DBStorage__engine, "before_cursor_execute",
+                     lambda *args: statements.append(args[2]))
+        cached.query(State, order_by="name")
+        cached.close()
+        count = len(statements)
+        self.assertEqual(cached.query(State, order_by="name")[0].name,
+                         "California")
+        self.assertEqual(len(statements), count)
+        self.assertEqual(cached.cache_stats()['hits'], 1)
+        self.assertEqual(cached.cache_stats()['misses'], 1)
+        cached.new(State(name="Alabama"))
+        cached.save()
+        self.assertEqual([state.name for state in cached.query(
+            State, order_by="name")], ["Alabama", "California"])
+        self.assertEqual(cached.count(State), 2)
+        cached.close()
+
+    def test_cache_load(self):
+        """ Results with eager loaded children are invalidated by them """
+        with mock.patch.dict(os.environ, {"HBNB_SQLITE_PATH": self.path,
+                                          "HBNB_DB_CACHE": "lru"}):
+            cached = SQLiteStorage()
+        cached.reload()
+        user = User(email="a@b.c", password="pwd")
+        state = State(name="California")
+        city = City(name="Fresno", state_id=state.id)
+        for obj in (user, state, city):
+            cached.new(obj)
+            cached.save()
+        self.assertEqual(cached.query(City, load=["places"])[0].places, [])
+        self.assertEqual(cached.get(City, city.id).places, [])
+        cached.new(Place(name="Loft", city_id=city.id, user_id=user.id))
+        cached.save()
+        cached.close()
+        places = cached.query(City, load=["places"])[0].places
+        self.assertEqual([place.name for place in places], ["Loft"])
+        self.assertEqual(cached.cache_stats()['hits'], 0)
+        cached.close()
+        places = cached.get(City, city.id).places
+        self.assertEqual([place.name for place in places], ["Loft"])
+        self.assertEqual(cached.cache_stats()['hits'], 1)
+        cached.close()
+
+    def test_replicas(self):
+        """ Reads go to the replica until the session writes """
+        replica = os.path.join(self.directory, 'replica.db')
+        env = {"HBNB_SQLITE_PATH": self.path,
+               "HBNB_SQLITE_REPLICA_PATHS": replica}
+        with mock.patch.dict(os.environ, env):
+            split = SQLiteStorage()
+        split.reload()
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.save()
+        # Nothing replicates between the two files, the replica is empty
+        self.assertEqual(split.count(State), 0)
+        self.assertEqual(split.all(State), {})
+        self.assertIsNone(split.get(State, state.id))
+        split.close()
+        split.use_primary()
+        self.assertEqual(split.count(State), 1)
+        split.close()
+        self.assertEqual(split.count(State), 0)
+        split.new(State(name="Nevada"))
+        split.save()
+        self.assertEqual(split.count(State), 2)
+        split.close()
+        with sqlite3.connect(replica) as db:
+            self.assertEqual(db.execute('SELECT COUNT(*) FROM states')
+                             .fetchone(), (0,))
+
+    def test_all_workers(self):
+        """ all() queries the classes concurrently with workers """
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.new(User(email="a@b.c", password="pwd"))
+        self.storage.save()
+        env = {"HBNB_SQLITE_PATH": self.path, "HBNB_DB_ALL_WORKERS": "4"}
+        with mock.patch.dict(os.environ, env):
+            workers = SQLiteStorage()
+        workers.reload()
+        objs = workers.all()
+        self.assertEqual(sorted(objs), sorted(self.storage.all()))
+        self.assertIs(objs['State.' + state.id],
+                      workers.get(State, state.id))
+        self.assertIn('State', workers.timings())
+        self.assertGreaterEqual(workers.timings()['total'],
+                                workers.timings()['State'])
+        workers.close()
+
+    def test_pool_stats(self):
+        """ The pool is sized by HBNB_DB_POOL_* and counts checkouts """
+        env = {"HBNB_SQLITE_PATH": self.path, "HBNB_DB_POOL_SIZE": "2",
+               "HBNB_DB_POOL_OVERFLOW": "1"}
+        with mock.patch.dict(os.environ, env):
+            pooled = SQLiteStorage()
+        pooled.reload()
+        pooled.count(State)
+        stats = pooled.pool_stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['checked_out'], 1)
+        self.assertGreaterEqual(stats['checkouts'], 1)
+        self.assertGreaterEqual(stats['wait'], stats['wait_max'])
+        pooled.close()
+        self.assertEqual(pooled.pool_stats()['checked_out'], 0)
+
+    def plan(self, sql):
+        """ The EXPLAIN QUERY PLAN details of sql """
+        with sqlite3.connect(self.path) as db:
+            return " | ".join(row[-1] for row in db.execute(
+                'EXPLAIN QUERY PLAN ' + sql, ('x',) * sql.count('?')))
+
+    def test_explain_foreign_keys(self):
+        """ Foreign key lookups search an index """
+        for table, column in [("cities", "state_id"), ("places", "user_id"),
+                              ("reviews", "place_id"),
+                              ("reviews", "user_id"),
+                              ("place_amenity", "amenity_id")]:
+            plan = self.plan('SELECT * FROM {} WHERE {} = ?'
+                             .format(table, column))
+            self.assertIn('USING INDEX ix_{}_{}'.format(table, column),
+                          plan)
+
+    def test_explain_city_price(self):
+        """ Places of a city come sorted by price from one index """
+        plan = self.plan('SELECT * FROM places WHERE city_id = ? '
+                         'ORDER BY price_by_night')
+        self.assertIn('USING INDEX ix_places_city_id_price_by_night', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        plan = self.plan('SELECT * FROM places WHERE city_id = ? '
+                         'AND price_by_night < 100')
+        self.assertIn('ix_places_city_id_price_by_night', plan)
+
+    def test_explain_names(self):
+        """ Sorting by name reads an index rather than sorting """
+        for table in ("states", "cities", "amenities"):
+            plan = self.plan('SELECT * FROM {} ORDER BY name'.format(table))
+            self.assertIn('USING INDEX ix_{}_name'.format(table), plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_migrations(self):
+        """ reload() adds the indexes to a database made without them """
+        with sqlite3.connect(self.path) as db:
+            self.assertEqual(db.execute(
+                'SELECT version FROM schema_migrations').fetchall(),
+                [(len(migrations.MIGRATIONS),)])
+            for name, in db.execute("SELECT name FROM sqlite_master "
+                                    "WHERE name LIKE 'ix_%'").fetchall():
+                db.execute('DROP INDEX ' + name)
+            db.execute('DELETE FROM schema_migrations')
+        self.assertNotIn('ix_cities_state_id',
+                         self.plan('SELECT * FROM cities WHERE state_id = ?'))
+        self.storage.reload()
+        self.assertIn('ix_cities_state_id',
+                      self.plan('SELECT * FROM cities WHERE state_id = ?'))
+        with self.storage._DBStorage__engine.begin() as connection:
+            self.assertEqual(migrations.version(connection),
+                             len(migrations.MIGRATIONS))
+            self.assertEqual(migrations.upgrade(connection), [])
+
+    def test_migrations_race(self):
+        """ upgrade() leaves what another worker did first alone """
+        create = migrations.create
+
+        def late(connection, element):
+            """ Creates element as if checkfirst found it missing """
+            unchecked = type(element).create
+            with mock.patch.object(type(element), 'create',
+                                   lambda element, bind, checkfirst:
+                                   unchecked(element, bind)):
+                create(connection, element)
+        with self.storage._DBStorage__engine.begin() as connection, \
+                mock.patch.object(migrations, 'create', late), \
+                mock.patch.object(migrations, 'version', return_value=0):
+            self.assertEqual(migrations.upgrade(connection), [])
+        with sqlite3.connect(self.path) as db:
+            self.assertEqual(db.execute(
+                'SELECT version FROM schema_migrations').fetchall(),
+                [(len(migrations.MIGRATIONS),)])
+
+    def test_reload(self):
+        """ Saved objects are read back by a new storage """
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.save()
+        with mock.patch.dict(os.environ, {"HBNB_SQLITE_PATH": self.path}):
+            other = SQLiteStorage()
+        other.reload()
+        self.assertEqual(other.all(State)['State.' + state.id].name,
+                         "California")
+        other.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+"""
+starts an ASGI web application serving the states from the async storage
+"""
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from os import path
+import models
+from models import *
+
+templates = Environment(
+    loader=FileSystemLoader(path.join(path.dirname(__file__), 'templates')),
+    autoescape=select_autoescape())
+
+
+async def states(state_id=None):
+    """render the states listed in alphabetical order, or the cities of
+    the State state_id"""
+    template = templates.get_template('9-states.html')
+    if state_id is None:
+        states = await models.async_storage.query("State", order_by="name")
+        return template.render(states=states)
+
+    return template.render(state_id=state_id,
+                           state=await models.async_storage.get(
+                               "State", state_id, load=["cities"]))
+
+
+async def lifespan(receive, send):
+    """closes the pooled connections of the async storage at shutdown,
+    in the event loop they were opened in"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if "async_storage" in vars(models):
+                await models.async_storage.dispose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI application: every request is served by the same event loop,
+    so a request waiting for the database leaves it to the others and
+    the async storage keeps its connections pooled between requests"""
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    route = scope["path"].strip("/").split("/")
+    if route[0] != "states" or len(route) > 2:
+        status, body = 404, "Not Found"
+    elif scope["method"] not in ("GET", "HEAD"):
+        status, body = 405, "Method Not Allowed"
+    else:
+        try:
+            status, body = 200, await states(*route[1:])
+        finally:
+            # Closes the session of this request's task
+            await models.async_storage.close()
+
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"text/html; charset=utf-8")]})
+    await send({"type": "http.response.body",
+                "body": body.encode() if scope["method"] != "HEAD" else b""})
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5000)